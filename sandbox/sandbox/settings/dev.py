@@ -11,6 +11,9 @@ ALLOWED_HOSTS = ["*"]
 
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
 
+# the development server runs a single process
+SILENCED_SYSTEM_CHECKS = ["wagtail_webstories_editor.W001"]
+
 
 try:
     from .local import *
@@ -4,6 +4,8 @@ from wagtail.contrib.search_promotions.models import Query
 
 from wagtail.models import Page
 
+from wagtail_webstories_editor.models import WebStory
+
 
 def search(request):
     search_query = request.GET.get("query", None)
@@ -12,12 +14,17 @@ def search(request):
     # Search
     if search_query:
         search_results = Page.objects.live().search(search_query)
+        story_results = list(WebStory.objects.search_live(search_query)[:10])
         query = Query.get(search_query)
         
         # Record hit
         query.add_hit()
     else:
         search_results = Page.objects.none()
+        story_results = []
+
+    for story in story_results:
+        story.link = story.get_link(request)
     
     # Pagination
     paginator = Paginator(search_results, 10)
@@ -34,5 +41,6 @@ def search(request):
         {
             "search_query": search_query,
             "search_results": search_results,
+            "story_results": story_results,
         },
     )
@@ -1,8 +1,15 @@
 import mimetypes
+import os
+from functools import lru_cache
+from types import SimpleNamespace
 
+from django.db.models import Prefetch
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.fields import ReadOnlyField
-from wagtail.api.v2.utils import get_full_url
+from rest_framework.filters import BaseFilterBackend
+from wagtail.api.v2.filters import FieldsFilter, SearchFilter
+from wagtail.api.v2.serializers import TagsField
+from wagtail.api.v2.utils import BadRequestError, get_full_url
 from wagtail.documents.api.v2.serializers import DocumentSerializer
 from wagtail.documents.api.v2.views import DocumentsAPIViewSet
 from wagtail.images.api.v2.serializers import ImageSerializer
@@ -10,6 +17,26 @@ from wagtail.images.api.v2.views import ImagesAPIViewSet
 from wagtailmedia.api.serializers import MediaItemSerializer
 from wagtailmedia.api.views import MediaAPIViewSet
 
+from wagtail_webstories_editor.renditions import get_editor_thumbnail_filters, get_existing_editor_renditions
+from wagtail_webstories_editor.video_optimization import VIDEO_FORMATS, get_optimized_variants
+
+
+# maximum number of items matched by a search of the media library
+MAX_SEARCH_RESULTS = 1000
+
+
+@lru_cache(maxsize=None)
+def guess_mime_type_for_extension(extension):
+    mimetype, encoding = mimetypes.guess_type("file" + extension)
+    return mimetype
+
+
+def guess_mime_type(file_name):
+    """
+    Guess the mime type of a file from the extension of its name, without accessing the storage
+    """
+    return guess_mime_type_for_extension(os.path.splitext(file_name or "")[1].lower())
+
 
 class ImageDownloadUrlField(ReadOnlyField):
     """
@@ -38,8 +65,7 @@ class MimeTypeField(ReadOnlyField):
         return instance
 
     def to_representation(self, instance):
-        mimetype, encoding = mimetypes.guess_type(instance.file.name)
-        return mimetype
+        return guess_mime_type(instance.file.name)
 
 
 class ImageSizeField(ReadOnlyField):
@@ -54,46 +80,257 @@ class ImageSizeField(ReadOnlyField):
         return instance
 
     def to_representation(self, instance):
-        width = instance.file.width
-        height = instance.file.height
-        return {"width": width, "height": height}
+        # the dimensions stored on the image, reading them from the file would open it from the storage
+        return {"width": instance.width, "height": instance.height}
+
+
+class ImageThumbnailField(ReadOnlyField):
+    """
+    Serializes the "thumbnail" field for image items, from the editor thumbnail renditions generated when
+    the image was saved. None until they are generated, the original file can be used meanwhile.
+
+    Example:
+    "thumbnail": {"url": "http://api.example.com/media/images/my_image.max-300x300.png", "width": 300, "height": 200}
+    """
+
+    def get_attribute(self, instance):
+        return instance
+
+    def to_representation(self, instance):
+        renditions = get_existing_editor_renditions(instance)
+
+        if not renditions:
+            return None
+
+        return {
+            "url": get_full_url(self.context["request"], renditions[0].url),
+            "width": renditions[0].width,
+            "height": renditions[0].height,
+        }
+
+
+class ImageSrcsetField(ReadOnlyField):
+    """
+    Serializes the "srcset" field for image items, from the editor thumbnail renditions.
+
+    Example:
+    "srcset": "http://api.example.com/media/images/my_image.max-300x300.png 300w, ..."
+    """
+
+    def get_attribute(self, instance):
+        return instance
+
+    def to_representation(self, instance):
+        return ", ".join(
+            "%s %dw" % (get_full_url(self.context["request"], rendition.url), rendition.width)
+            for rendition in get_existing_editor_renditions(instance)
+        ) or None
+
+
+class PrefetchedTagsField(TagsField):
+    """
+    Serializes the "tags" field from the tags prefetched by the viewset, instead of querying them for each item.
+
+    Example:
+    "tags": ["bird", "wagtail"]
+    """
+
+    def to_representation(self, value):
+        return sorted(tag.name for tag in value.all())
+
+
+class PrefetchTagsMixin:
+    def get_queryset(self):
+        return super().get_queryset().prefetch_related("tags")
+
+
+class PrefetchOptimizedVariantsMixin:
+    def get_queryset(self):
+        return super().get_queryset().prefetch_related("optimized_variants")
+
+
+class PrefetchEditorRenditionsMixin:
+    def get_queryset(self):
+        # the thumbnail fields only read prefetched renditions, listings never generate renditions
+        specs = [f.spec for f in get_editor_thumbnail_filters()]
+        renditions = self.model.get_rendition_model().objects.filter(filter_spec__in=specs)
+        return super().get_queryset().prefetch_related(Prefetch("renditions", queryset=renditions))
+
+
+class BatchFieldsFilter(FieldsFilter):
+    """
+    Field filters, with batch lookups: ``?id=1,2,3`` returns the items with these ids in a single request
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        ids = request.GET.get("id", "")
+
+        if "," not in ids:
+            return super().filter_queryset(request, queryset, view)
+
+        try:
+            ids = [int(pk) for pk in ids.split(",") if pk]
+        except ValueError:
+            raise BadRequestError("id must be an integer or a comma separated list of integers")
+
+        # the other field filters still apply
+        query_params = request.GET.copy()
+        del query_params["id"]
+
+        return super().filter_queryset(SimpleNamespace(GET=query_params), queryset.filter(pk__in=ids), view)
+
+
+class SearchMatchesFilter(SearchFilter):
+    """
+    Full-text search (``?search=``) restricting the items to the ``MAX_SEARCH_RESULTS`` most relevant matches. The
+    search runs on all the items, so the other filters and the order apply without being indexed as filter fields of
+    the image, document or media model.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if "search" not in request.GET:
+            return queryset
+
+        # without an order, the search backend orders by relevance, which needs no indexed field
+        query_params = request.GET.copy()
+        query_params.pop("order", None)
+
+        matches = super().filter_queryset(
+            SimpleNamespace(GET=query_params), queryset.model.objects.only("pk"), view
+        )[:MAX_SEARCH_RESULTS]
+
+        return queryset.filter(pk__in=[item.pk for item in matches])
+
+
+MEDIA_LIBRARY_FILTERS = {
+    FieldsFilter: BatchFieldsFilter,
+    SearchFilter: SearchMatchesFilter,
+}
+
+
+def with_media_library_filters(filter_backends):
+    return [MEDIA_LIBRARY_FILTERS.get(backend, backend) for backend in filter_backends]
+
+
+class KeysetPaginationFilter(BaseFilterBackend):
+    """
+    Implements the ``?after=<id>`` parameter, returning the items that follow the one with this id in the
+    ``id`` or ``-id`` order. Unlike ``offset``, it stays fast deep into large media libraries.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if "after" not in request.GET:
+            return queryset
+
+        try:
+            after = int(request.GET["after"])
+        except ValueError:
+            raise BadRequestError("after must be an integer")
+
+        order = request.GET.get("order", "id")
+
+        if order == "id":
+            return queryset.filter(pk__gt=after)
+        if order == "-id":
+            return queryset.filter(pk__lt=after)
+
+        raise BadRequestError("after can only be used with the 'id' or '-id' order")
 
 
 class CustomImageSerializer(ImageSerializer):
+    tags = PrefetchedTagsField()
     download_url = ImageDownloadUrlField()
     mime_type = MimeTypeField()
     size = ImageSizeField()
+    thumbnail = ImageThumbnailField()
+    srcset = ImageSrcsetField()
 
 
-class CustomImagesAPIViewSet(ImagesAPIViewSet):
+class CustomImagesAPIViewSet(PrefetchEditorRenditionsMixin, PrefetchTagsMixin, ImagesAPIViewSet):
     base_serializer_class = CustomImageSerializer
-    meta_fields = ImagesAPIViewSet.meta_fields + ["mime_type", "size"]
+    filter_backends = [KeysetPaginationFilter] + with_media_library_filters(ImagesAPIViewSet.filter_backends)
+    known_query_parameters = ImagesAPIViewSet.known_query_parameters.union(["after"])
+    meta_fields = ImagesAPIViewSet.meta_fields + ["mime_type", "size", "thumbnail", "srcset"]
     listing_default_fields = ImagesAPIViewSet.listing_default_fields + [
-        "mime_type", "size"
+        "mime_type", "size", "thumbnail", "srcset"
     ]
     nested_default_fields = ImagesAPIViewSet.nested_default_fields + [
         "mime_type", "size"
     ]
 
 
+class MediaThumbnailUrlField(ReadOnlyField):
+    """
+    Serializes the "thumbnail_url" field for media items, used as poster of videos.
+
+    Example:
+    "thumbnail_url": "http://api.example.com/media/media_thumbnails/my_video.jpg"
+    """
+
+    def get_attribute(self, instance):
+        return instance
+
+    def to_representation(self, instance):
+        if not instance.thumbnail:
+            return None
+        return get_full_url(self.context["request"], instance.thumbnail.url)
+
+
+class MediaOptimizedVariantsField(ReadOnlyField):
+    """
+    Serializes the "optimized" field for videos: their web-optimized variants, in order of preference.
+    Empty until the video has been optimized.
+
+    Example:
+    "optimized": [{"url": "http://api.example.com/media/webstories_media_variants/my_video.webm",
+                   "mime_type": "video/webm", "width": 720, "height": 1280}]
+    """
+
+    def get_attribute(self, instance):
+        return instance
+
+    def to_representation(self, instance):
+        return [
+            {
+                "url": get_full_url(self.context["request"], variant.file.url),
+                "mime_type": VIDEO_FORMATS[variant.format]["mime_type"],
+                "width": variant.width,
+                "height": variant.height,
+            }
+            for variant in get_optimized_variants(instance)
+        ]
+
+
 class CustomMediaItemSerializer(MediaItemSerializer):
+    tags = PrefetchedTagsField()
     mime_type = MimeTypeField()
+    thumbnail_url = MediaThumbnailUrlField()
+    optimized = MediaOptimizedVariantsField()
 
 
-class CustomMediaAPIViewSet(MediaAPIViewSet):
+class CustomMediaAPIViewSet(PrefetchOptimizedVariantsMixin, PrefetchTagsMixin, MediaAPIViewSet):
     base_serializer_class = CustomMediaItemSerializer
-    meta_fields = ImagesAPIViewSet.meta_fields + ["mime_type"]
-    listing_default_fields = ImagesAPIViewSet.listing_default_fields + ["mime_type"]
+    body_fields = MediaAPIViewSet.body_fields + ["duration"]
+    meta_fields = ImagesAPIViewSet.meta_fields + ["mime_type", "thumbnail_url", "optimized"]
+    listing_default_fields = ImagesAPIViewSet.listing_default_fields + [
+        "mime_type", "thumbnail_url", "optimized", "width", "height", "duration"
+    ]
 
-    filter_backends = MediaAPIViewSet.filter_backends + [DjangoFilterBackend]
+    filter_backends = [KeysetPaginationFilter, DjangoFilterBackend] + with_media_library_filters(
+        MediaAPIViewSet.filter_backends
+    )
     filterset_fields = ["type"]
+    known_query_parameters = MediaAPIViewSet.known_query_parameters.union(["after"])
 
 
 class CustomDocumentSerializer(DocumentSerializer):
+    tags = PrefetchedTagsField()
     mime_type = MimeTypeField()
 
 
-class CustomDocumentAPIViewSet(DocumentsAPIViewSet):
+class CustomDocumentAPIViewSet(PrefetchTagsMixin, DocumentsAPIViewSet):
     base_serializer_class = CustomDocumentSerializer
+    filter_backends = [KeysetPaginationFilter] + with_media_library_filters(DocumentsAPIViewSet.filter_backends)
+    known_query_parameters = DocumentsAPIViewSet.known_query_parameters.union(["after"])
     meta_fields = ImagesAPIViewSet.meta_fields + ["mime_type"]
     listing_default_fields = ImagesAPIViewSet.listing_default_fields + ["mime_type"]
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class WagtailWebstoriesEditorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'wagtail_webstories_editor'
+
+    def ready(self):
+        from . import checks  # noqa: F401
+        from .signal_handlers import register_signal_handlers
+
+        register_signal_handlers()
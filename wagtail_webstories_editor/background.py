@@ -0,0 +1,48 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections
+
+try:
+    from django_tasks import task
+except ImportError:
+    task = None
+
+logger = logging.getLogger(__name__)
+
+_pool_lock = threading.Lock()
+_executors = {}
+
+
+def get_executor(pool, workers):
+    """
+    The pool of ``workers`` background threads named ``pool``, created on first use in each process
+    """
+    with _pool_lock:
+        if pool not in _executors:
+            _executors[pool] = ThreadPoolExecutor(max_workers=max(workers, 1),
+                                                  thread_name_prefix=f"webstories-{pool}")
+
+    return _executors[pool]
+
+
+def run_in_thread(func, *args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception("Could not run %s%r", func.__name__, args)
+    finally:
+        connections.close_all()
+
+
+def enqueue(background_task, func, *args, pool, workers):
+    """
+    Run ``background_task`` with a django-tasks worker when it is installed, or else ``func``, which does the same
+    work, in the ``pool`` of background threads. Tasks must be defined at module level with ``task`` for workers to
+    find them, and are None without django-tasks.
+    """
+    if background_task is None:
+        get_executor(pool, workers).submit(run_in_thread, func, *args)
+    else:
+        background_task.enqueue(*args)
@@ -0,0 +1,311 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ObjectDoesNotExist
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from wagtail_webstories_editor import get_webstories_listing_page_model
+from wagtail_webstories_editor.compression import get_content_hash, get_preferred_encoding
+
+STORY_RESPONSE_CACHE_PREFIX = "wagtail_webstories_editor:story_response"
+STORY_RESPONSE_GENERATION_CACHE_KEY = "wagtail_webstories_editor:story_response_generation"
+LISTING_PAGE_URLS_CACHE_KEY = "wagtail_webstories_editor:listing_page_urls"
+SITEMAP_VERSION_CACHE_KEY = "wagtail_webstories_editor:sitemap_version"
+EDITOR_HTML_CACHE_PREFIX = "wagtail_webstories_editor:editor_html"
+SETTING_CACHE_PREFIX = "wagtail_webstories_editor:setting"
+SETTING_CACHE_TIMEOUT = 5 * 60
+STORY_COUNTS_CACHE_KEY = "wagtail_webstories_editor:story_counts"
+VIDEO_OPTIMIZATION_CACHE_PREFIX = "wagtail_webstories_editor:video_optimization"
+STORY_COMPRESSION_CACHE_PREFIX = "wagtail_webstories_editor:story_compression"
+
+
+def get_webstories_cache():
+    """
+    Get the cache used by the package, from the ``WAGTAIL_WEBSTORIES_EDITOR_CACHE`` setting.
+    Defaults to the ``default`` cache.
+    """
+    return caches[getattr(settings, "WAGTAIL_WEBSTORIES_EDITOR_CACHE", "default")]
+
+
+def get_webstories_cache_timeout():
+    return getattr(settings, "WAGTAIL_WEBSTORIES_EDITOR_CACHE_TIMEOUT", 60 * 60 * 24)
+
+
+def get_listing_page_url(request=None):
+    """
+    Full url of the live web stories listing page, or None if there is none.
+    Urls are cached per site hostname, and dropped whenever pages or sites change.
+    """
+    site_key = request.get_host() if request else ""
+
+    cache = get_webstories_cache()
+    listing_page_urls = cache.get(LISTING_PAGE_URLS_CACHE_KEY) or {}
+
+    if site_key not in listing_page_urls:
+        listing_page_url = None
+
+        WebStoryListPage = get_webstories_listing_page_model()
+        if WebStoryListPage:
+            list_page = WebStoryListPage.objects.live().first()
+            if list_page:
+                listing_page_url = list_page.get_full_url(request)
+
+        listing_page_urls[site_key] = listing_page_url
+        cache.set(LISTING_PAGE_URLS_CACHE_KEY, listing_page_urls, get_webstories_cache_timeout())
+
+    return listing_page_urls[site_key]
+
+
+def invalidate_listing_page_url_cache():
+    get_webstories_cache().delete(LISTING_PAGE_URLS_CACHE_KEY)
+
+
+def get_setting_cache_timeout():
+    # settings are invalidated in the process that saves them, so other processes with a process-local cache
+    # pick up changes within minutes
+    return min(get_webstories_cache_timeout(), SETTING_CACHE_TIMEOUT)
+
+
+def get_setting_cache_key(site_id):
+    return f"{SETTING_CACHE_PREFIX}:{site_id}"
+
+
+def invalidate_setting_cache(site_ids):
+    get_webstories_cache().delete_many([get_setting_cache_key(site_id) for site_id in site_ids])
+
+
+def get_publisher_logos_etag(request, publisher_logos):
+    """
+    ETag of the publisher logos list, which changes with the logos, their images and the host they are served from
+    """
+    version = ";".join(f"{logo.pk}:{logo.logo_id}:{logo.default}:{logo.logo.file.name}" for logo in publisher_logos)
+    version = f"{request.scheme}://{request.get_host()}|{version}"
+    return quote_etag(hashlib.md5(version.encode()).hexdigest())
+
+
+def get_story_counts_cache():
+    return get_webstories_cache().get(STORY_COUNTS_CACHE_KEY)
+
+
+def set_story_counts_cache(counts):
+    # dropped when stories are created, published, unpublished or deleted, and expires in case a change was missed
+    get_webstories_cache().set(STORY_COUNTS_CACHE_KEY, counts, get_webstories_cache_timeout())
+
+
+def invalidate_story_counts_cache():
+    get_webstories_cache().delete(STORY_COUNTS_CACHE_KEY)
+
+
+def claim_video_optimization(media_id, timeout):
+    """
+    Mark a video as being optimized, returning False if it already is, so that the autosaves of a story do not
+    enqueue its videos again while they are transcoded
+    """
+    return get_webstories_cache().add(f"{VIDEO_OPTIMIZATION_CACHE_PREFIX}:{media_id}", True, timeout)
+
+
+def release_video_optimization(media_id):
+    get_webstories_cache().delete(f"{VIDEO_OPTIMIZATION_CACHE_PREFIX}:{media_id}")
+
+
+def claim_story_compression(story_pk, revision_id):
+    """
+    Mark the html served for a live revision of a story as being compressed, returning False if it already was, so
+    that a story rendered differently on each request is not compressed on each of them
+    """
+    key = f"{STORY_COMPRESSION_CACHE_PREFIX}:{story_pk}:{revision_id}"
+    return get_webstories_cache().add(key, True, get_webstories_cache_timeout())
+
+
+def get_sitemap_version():
+    """
+    Version of the cached sitemap sections, bumped whenever the set of live stories changes
+    """
+    cache = get_webstories_cache()
+    version = cache.get(SITEMAP_VERSION_CACHE_KEY)
+
+    if version is None:
+        version = 1
+        cache.add(SITEMAP_VERSION_CACHE_KEY, version, None)
+
+    return version
+
+
+def invalidate_sitemap_cache():
+    cache = get_webstories_cache()
+
+    try:
+        cache.incr(SITEMAP_VERSION_CACHE_KEY)
+    except ValueError:
+        cache.set(SITEMAP_VERSION_CACHE_KEY, 1, None)
+
+
+def get_story_etag(story):
+    """
+    Strong ETag for the live version of a story. It changes whenever a new revision goes live.
+    """
+    last_published_at = story.last_published_at.isoformat() if story.last_published_at else ""
+    version = f"{story.pk}:{story.live_revision_id}:{last_published_at}"
+    return hashlib.md5(version.encode()).hexdigest()
+
+
+def get_story_response_cache_key(list_page, story_id):
+    # story_id is either a pk or a slug, taken straight from the url
+    story_id_hash = hashlib.md5(str(story_id).encode()).hexdigest()
+    return f"{STORY_RESPONSE_CACHE_PREFIX}:{list_page.pk}:{story_id_hash}"
+
+
+def get_story_aliases_cache_key(story_pk, index=None):
+    # the number of keys recorded for a story, or the key recorded under one index
+    if index is None:
+        return f"{STORY_RESPONSE_CACHE_PREFIX}:aliases:{story_pk}"
+    return f"{STORY_RESPONSE_CACHE_PREFIX}:aliases:{story_pk}:{index}"
+
+
+def get_story_response_generation():
+    """
+    Generation of the cached story responses, bumped whenever some of them are invalidated. Read before loading a
+    story, it tells whether the story may have changed by the time its response is cached.
+    """
+    cache = get_webstories_cache()
+    generation = cache.get(STORY_RESPONSE_GENERATION_CACHE_KEY)
+
+    if generation is None:
+        # never a value the generation had before it was evicted
+        cache.add(STORY_RESPONSE_GENERATION_CACHE_KEY, time.time_ns(), None)
+        generation = cache.get(STORY_RESPONSE_GENERATION_CACHE_KEY)
+
+    return generation
+
+
+def get_cached_story_response(list_page, story_id):
+    return get_webstories_cache().get(get_story_response_cache_key(list_page, story_id))
+
+
+def cache_story_response(list_page, story_id, story, response, generation):
+    """
+    Store the rendered bytes of a story response. A story can be reached by pk or by slug,
+    so every key used for it is remembered, to be able to drop them all on invalidation.
+    ``generation`` is the one read before loading the story: if stories were invalidated since, the story may
+    be stale and the entry is dropped.
+    """
+    cache = get_webstories_cache()
+    timeout = get_webstories_cache_timeout()
+
+    cache_key = get_story_response_cache_key(list_page, story_id)
+    entry = {
+        "story_pk": story.pk,
+        "etag": get_story_etag(story),
+        "last_modified": int(story.last_published_at.timestamp()) if story.last_published_at else None,
+        "content_type": response.get("Content-Type"),
+        "content": response.content,
+        "encodings": get_story_encodings(story, response.content),
+    }
+    cache.set(cache_key, entry, timeout)
+
+    # every key is recorded under its own index, taken with an atomic increment, so that concurrent misses
+    # never overwrite each other's keys
+    count_key = get_story_aliases_cache_key(story.pk)
+    cache.add(count_key, 0, timeout)
+    try:
+        index = cache.incr(count_key)
+    except ValueError:
+        # invalidated meanwhile, the entry may already be stale
+        cache.delete(cache_key)
+        return entry
+
+    cache.touch(count_key, timeout)
+    cache.set(get_story_aliases_cache_key(story.pk, index), cache_key, timeout)
+
+    # an invalidation that bumped the generation before this check reads the key recorded above, one that bumped
+    # it after loading the story is caught here
+    if cache.get(STORY_RESPONSE_GENERATION_CACHE_KEY) != generation:
+        cache.delete(cache_key)
+
+    return entry
+
+
+def get_story_encodings(story, content):
+    """
+    Pre-compressed variants of the story, if they were generated from ``content``, its html rendered for its live
+    revision
+    """
+    try:
+        compressed_html = story.compressed_html
+    except ObjectDoesNotExist:
+        return {}
+
+    if compressed_html.revision_id != story.live_revision_id:
+        return {}
+
+    if compressed_html.content_hash != get_content_hash(content):
+        return {}
+
+    return compressed_html.encodings
+
+
+def invalidate_story_response_cache(story_pk):
+    cache = get_webstories_cache()
+
+    # first, so that responses of the story being cached meanwhile are dropped
+    try:
+        cache.incr(STORY_RESPONSE_GENERATION_CACHE_KEY)
+    except ValueError:
+        cache.set(STORY_RESPONSE_GENERATION_CACHE_KEY, time.time_ns(), None)
+
+    count_key = get_story_aliases_cache_key(story_pk)
+    count = cache.get(count_key) or 0
+    aliases_keys = [get_story_aliases_cache_key(story_pk, index) for index in range(1, count + 1)]
+    cache_keys = list(cache.get_many(aliases_keys).values())
+    cache.delete_many(cache_keys + aliases_keys + [count_key])
+
+
+def story_response_from_cache_entry(request, entry):
+    """
+    Build a response from a cached entry, answering with a 304 when the client copy is current.
+    Pre-compressed variants are served as they are, to clients that accept them.
+    """
+    encodings = entry.get("encodings") or {}
+    encoding = get_preferred_encoding(request, encodings)
+
+    # each representation of the story gets its own strong etag
+    etag = quote_etag(f"{entry['etag']}-{encoding}" if encoding else entry["etag"])
+    last_modified = entry["last_modified"]
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+    if response is None:
+        content = encodings[encoding] if encoding else entry["content"]
+        response = HttpResponse(content, content_type=entry["content_type"])
+        if encoding:
+            response["Content-Encoding"] = encoding
+
+    response["ETag"] = etag
+    if last_modified:
+        response["Last-Modified"] = http_date(last_modified)
+    if encodings:
+        patch_vary_headers(response, ["Accept-Encoding"])
+
+    return response
+
+
+def get_editor_html(story_pk, draft_version):
+    """
+    The html last sent by the editor for a version of the latest revision, before processing. Incremental saves are
+    diffed against it.
+    """
+    entry = get_webstories_cache().get(f"{EDITOR_HTML_CACHE_PREFIX}:{story_pk}")
+
+    if not entry or entry["version"] != draft_version:
+        return None
+
+    return entry["html"]
+
+
+def set_editor_html(story_pk, draft_version, html):
+    entry = {"version": draft_version, "html": html}
+    get_webstories_cache().set(f"{EDITOR_HTML_CACHE_PREFIX}:{story_pk}", entry, get_webstories_cache_timeout())
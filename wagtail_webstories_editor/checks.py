@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+# caches that live in each server process, and so are only invalidated in the process handling a change
+PROCESS_LOCAL_CACHE_BACKENDS = ["django.core.cache.backends.locmem.LocMemCache"]
+
+
+@register(Tags.caches)
+def check_webstories_cache(app_configs, **kwargs):
+    alias = getattr(settings, "WAGTAIL_WEBSTORIES_EDITOR_CACHE", "default")
+    backend = settings.CACHES.get(alias, {}).get("BACKEND")
+
+    if backend not in PROCESS_LOCAL_CACHE_BACKENDS:
+        return []
+
+    return [
+        Warning(
+            f"The '{alias}' cache used by wagtail_webstories_editor is local to each process.",
+            hint=(
+                "Published, unpublished or deleted stories and changed settings are only invalidated in the process "
+                "handling the change, other processes keep serving them until they expire. Set "
+                "WAGTAIL_WEBSTORIES_EDITOR_CACHE to a shared cache when running several processes, or silence this "
+                "check if you run a single one."
+            ),
+            id="wagtail_webstories_editor.W001",
+        )
+    ]
@@ -0,0 +1,127 @@
+import gzip
+import hashlib
+import zlib
+
+from django.conf import settings
+from django.core.exceptions import BadRequest, RequestDataTooBig
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# content codings we can serve, in order of preference
+STORY_CONTENT_ENCODINGS = ["br", "gzip"]
+
+# content codings accepted for request bodies, with their zlib window bits
+REQUEST_CONTENT_ENCODINGS = {
+    "gzip": 16 + zlib.MAX_WBITS,
+    "deflate": zlib.MAX_WBITS,
+}
+
+REQUEST_BODY_CHUNK_SIZE = 64 * 1024
+
+
+def get_content_hash(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+def compress_story_html(content):
+    """
+    Returns the gzip and brotli variants of the rendered html of a story.
+    The brotli variant is None if the ``brotli`` package is not installed.
+    """
+    gzip_content = gzip.compress(content, compresslevel=9, mtime=0)
+    brotli_content = brotli.compress(content, quality=11) if brotli else None
+
+    return gzip_content, brotli_content
+
+
+def parse_accept_encoding(accept_encoding):
+    """
+    Returns a dict of content coding to quality value, from an Accept-Encoding header
+    """
+    encodings = {}
+
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+
+        encodings[coding] = quality
+
+    return encodings
+
+
+def get_preferred_encoding(request, available_encodings):
+    """
+    Pick the best content coding accepted by the client, among the available ones
+    """
+    accepted = parse_accept_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+
+    for encoding in STORY_CONTENT_ENCODINGS:
+        if encoding not in available_encodings:
+            continue
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+
+    return None
+
+
+def get_max_request_body_size():
+    """
+    Maximum decompressed size of request bodies, from the ``WAGTAIL_WEBSTORIES_EDITOR_MAX_REQUEST_BODY_SIZE``
+    setting. Defaults to Django's ``DATA_UPLOAD_MAX_MEMORY_SIZE``.
+    """
+    return getattr(settings, "WAGTAIL_WEBSTORIES_EDITOR_MAX_REQUEST_BODY_SIZE", settings.DATA_UPLOAD_MAX_MEMORY_SIZE)
+
+
+def get_request_body(request):
+    """
+    Returns the body of a request, decompressing it if it was sent with a gzip or deflate Content-Encoding.
+    The body is decompressed as it is read, and RequestDataTooBig is raised as soon as it gets larger than
+    the maximum request body size, so that a small compressed body can not exhaust memory.
+    """
+    encoding = request.headers.get("Content-Encoding", "").strip().lower()
+
+    if encoding in ["", "identity"]:
+        return request.body
+
+    if encoding not in REQUEST_CONTENT_ENCODINGS:
+        raise BadRequest("Unsupported request Content-Encoding '%s'" % encoding)
+
+    max_size = get_max_request_body_size()
+    decompressor = zlib.decompressobj(REQUEST_CONTENT_ENCODINGS[encoding])
+    chunks = []
+    size = 0
+
+    try:
+        while not decompressor.eof:
+            chunk = decompressor.unconsumed_tail or request.read(REQUEST_BODY_CHUNK_SIZE)
+            if not chunk:
+                break
+
+            # never inflate more than one byte past the limit at once
+            data = decompressor.decompress(chunk, max_size - size + 1 if max_size is not None else 0)
+            size += len(data)
+
+            if max_size is not None and size > max_size:
+                raise RequestDataTooBig("Request body exceeded the maximum size once decompressed.")
+
+            chunks.append(data)
+    except zlib.error:
+        raise BadRequest("Invalid %s request body" % encoding)
+
+    if not decompressor.eof:
+        raise BadRequest("Truncated %s request body" % encoding)
+
+    return b"".join(chunks)
@@ -0,0 +1,158 @@
+import base64
+import json
+from math import ceil
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import CharField, Count, Exists, F, OuterRef, Q
+from django.db.models.functions import Cast, Coalesce
+from django.utils.dateparse import parse_datetime
+from wagtail.models import Revision
+
+from wagtail_webstories_editor.cache import get_story_counts_cache, set_story_counts_cache
+from wagtail_webstories_editor.models import WebStory
+
+STORIES_PER_PAGE = 20
+
+# sort options of the dashboard, and the key they sort on. Stories are sorted on (key, id), which is indexed
+# for the date keys, and paginated with a cursor on these values. Stories that were never published or saved
+# fall back to their creation date, as in the dashboard.
+STORY_SORT_KEYS = {
+    "date": lambda: Coalesce("last_published_at", "created_at"),
+    "modified": lambda: Coalesce("latest_revision_created_at", "created_at"),
+    "title": lambda: F("title"),
+}
+DEFAULT_STORY_SORT = "date"
+
+STORY_STATUSES = ["publish", "draft"]
+
+# maximum number of stories matched by the text of their content
+MAX_SEARCH_RESULTS = 1000
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def get_story_statuses(status):
+    """
+    The dashboard asks for a comma separated list of WordPress statuses, of which stories can only be published
+    or draft
+    """
+    return [value for value in STORY_STATUSES if value in (status or "").split(",")] or STORY_STATUSES
+
+
+def filter_stories(queryset, search=None, author=None):
+    if search:
+        # the search backend matches the words of the live text, with stemming. The draft text, which is not
+        # indexed, is matched as is
+        live_matches = WebStory.objects.only("pk").search(search, order_by_relevance=False)[:MAX_SEARCH_RESULTS]
+
+        queryset = queryset.filter(
+            Q(title__icontains=search)
+            | Q(draft_title__icontains=search)
+            | Q(draft_search_text__icontains=search)
+            | Q(pk__in=[story.pk for story in live_matches])
+        )
+
+    if author:
+        # stories the user has saved a revision of
+        queryset = queryset.filter(Exists(Revision.objects.filter(
+            base_content_type=ContentType.objects.get_for_model(WebStory),
+            object_id=Cast(OuterRef("pk"), output_field=CharField()),
+            user_id=author,
+        )))
+
+    return queryset
+
+
+def filter_stories_by_status(queryset, statuses):
+    if len(statuses) == len(STORY_STATUSES):
+        return queryset
+
+    return queryset.filter(live="publish" in statuses)
+
+
+def get_story_counts_by_status(queryset):
+    """
+    Number of stories for each status of the dashboard, in a single query
+    """
+    counts = queryset.aggregate(all=Count("pk"), publish=Count("pk", filter=Q(live=True)))
+    counts["draft"] = counts["all"] - counts["publish"]
+    return counts
+
+
+def get_total_story_counts():
+    """
+    Number of stories for each status, counted again only after stories were created, published, unpublished
+    or deleted
+    """
+    counts = get_story_counts_cache()
+
+    if counts is None:
+        counts = get_story_counts_by_status(WebStory.objects.all())
+        set_story_counts_cache(counts)
+
+    return counts
+
+
+def encode_cursor(story):
+    value = story.sort_key
+    if hasattr(value, "isoformat"):
+        value = value.isoformat()
+
+    return base64.urlsafe_b64encode(json.dumps([value, story.pk]).encode()).decode("ascii")
+
+
+def decode_cursor(cursor, sort):
+    try:
+        value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+
+    if not isinstance(pk, int) or not isinstance(value, str):
+        raise InvalidCursor("Invalid cursor")
+
+    if sort != "title":
+        value = parse_datetime(value)
+        if value is None:
+            raise InvalidCursor("Invalid cursor")
+
+    return value, pk
+
+
+def get_stories_page(queryset, sort=None, direction=None, cursor=None, page=1, per_page=STORIES_PER_PAGE):
+    """
+    A page of stories, and the cursor of the next page if there is one. Without a cursor, the page number is
+    used as offset, which is only needed when the dashboard jumps to a page it has not fetched the previous one of.
+    """
+    if sort not in STORY_SORT_KEYS:
+        sort = DEFAULT_STORY_SORT
+
+    # titles are sorted alphabetically unless asked otherwise, dates from the most recent
+    descending = direction == "desc" if sort == "title" else direction != "asc"
+
+    queryset = queryset.annotate(sort_key=STORY_SORT_KEYS[sort]())
+
+    if descending:
+        queryset = queryset.order_by("-sort_key", "-pk")
+    else:
+        queryset = queryset.order_by("sort_key", "pk")
+
+    if cursor:
+        value, pk = decode_cursor(cursor, sort)
+        if descending:
+            queryset = queryset.filter(Q(sort_key__lt=value) | Q(sort_key=value, pk__lt=pk))
+        else:
+            queryset = queryset.filter(Q(sort_key__gt=value) | Q(sort_key=value, pk__gt=pk))
+    elif page > 1:
+        queryset = queryset[(page - 1) * per_page:]
+
+    # one more story than needed tells whether there is a next page, without counting
+    stories = list(queryset[:per_page + 1])
+    next_cursor = encode_cursor(stories[per_page - 1]) if len(stories) > per_page else None
+
+    return stories[:per_page], next_cursor
+
+
+def get_total_pages(count, per_page=STORIES_PER_PAGE):
+    return max(ceil(count / per_page), 1)
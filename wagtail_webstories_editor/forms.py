@@ -0,0 +1,28 @@
+from django.utils.translation import gettext_lazy as _
+from wagtail.admin.forms import WagtailAdminModelForm
+
+
+class WebStoriesSettingForm(WagtailAdminModelForm):
+    """
+    Settings form, checking that at most one of the publisher logos is the default
+    """
+
+    def is_valid(self):
+        # the logos are only cleaned along with the formsets, after the form itself
+        return super().is_valid() and self.has_single_default_logo()
+
+    def has_single_default_logo(self):
+        formset = self.formsets.get("publisher_logos")
+        if formset is None:
+            return True
+
+        default_logos = [
+            form for form in formset.forms
+            if form.cleaned_data.get("default") and not formset._should_delete_form(form)
+        ]
+
+        if len(default_logos) > 1:
+            self.add_error(None, _("Only one publisher logo can be the default."))
+            return False
+
+        return True
@@ -0,0 +1,171 @@
+import html
+import re
+
+# elements whose content is raw text and must not be tokenized, same as html.parser
+RAW_TEXT_ELEMENTS = {"script", "style"}
+
+VOID_ELEMENTS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "param", "source", "track", "wbr",
+}
+
+TOKEN_RE = re.compile(
+    r"""
+    (?P<comment><!--.*?-->)
+    |(?P<declaration><![^>]*>|<\?[^>]*>)
+    |(?P<end_tag></(?P<end_name>[a-zA-Z][^\s/>]*)[^>]*>)
+    |(?P<start_tag><(?P<start_name>[a-zA-Z][^\s/>]*)(?:[^>"']|"[^"]*"|'[^']*')*>)
+    """,
+    re.S | re.X,
+)
+
+ATTR_RE = re.compile(r"""([^\s/>"'=]+)(?:\s*=\s*("[^"]*"|'[^']*'|[^\s"'>]+))?""")
+
+
+class HTMLToken:
+    """
+    A chunk of the document, as it appears in the source.
+
+    Transformers can add markup around the token with ``before`` and ``after``, and change
+    attributes of start tags with ``set_attribute``. Untouched tokens are written back verbatim.
+    """
+    TEXT = "text"
+    START_TAG = "start_tag"
+    END_TAG = "end_tag"
+
+    def __init__(self, kind, text, name=None):
+        self.kind = kind
+        self.text = text
+        self.name = name.lower() if name else None
+        self.before = []
+        self.after = []
+        self._attrs = None
+
+    @property
+    def is_self_closing(self):
+        return self.kind == self.START_TAG and self.text.endswith("/>")
+
+    @property
+    def opens_element(self):
+        return (self.kind == self.START_TAG and not self.is_self_closing
+                and self.name not in VOID_ELEMENTS)
+
+    def _attr_matches(self):
+        offset = len(self.name) + 1
+        end = len(self.text) - (2 if self.is_self_closing else 1)
+        return ATTR_RE.finditer(self.text, offset, end)
+
+    @property
+    def attrs(self):
+        if self._attrs is None:
+            self._attrs = {}
+            for match in self._attr_matches():
+                value = match.group(2)
+                if value is None:
+                    value = ""
+                elif value[0] in "\"'":
+                    value = value[1:-1]
+                self._attrs.setdefault(match.group(1).lower(), html.unescape(value))
+        return self._attrs
+
+    def get_attribute(self, name, default=None):
+        return self.attrs.get(name, default)
+
+    def set_attribute(self, name, value):
+        attr = '%s="%s"' % (name, html.escape(value))
+
+        for match in self._attr_matches():
+            if match.group(1).lower() == name:
+                self.text = self.text[:match.start()] + attr + self.text[match.end():]
+                break
+        else:
+            end = len(self.text) - (2 if self.is_self_closing else 1)
+            self.text = self.text[:end] + " " + attr + self.text[end:]
+
+        self._attrs = None
+
+    def render(self):
+        if not self.before and not self.after:
+            return self.text
+        return "".join(self.before) + self.text + "".join(self.after)
+
+
+def tokenize(doc):
+    """
+    Split a document into text, start tag and end tag tokens, in a single pass.
+    Concatenating the text of all tokens gives back the original document.
+    """
+    pos = 0
+    length = len(doc)
+
+    while pos < length:
+        match = TOKEN_RE.search(doc, pos)
+
+        if match is None:
+            yield HTMLToken(HTMLToken.TEXT, doc[pos:])
+            return
+
+        if match.start() > pos:
+            yield HTMLToken(HTMLToken.TEXT, doc[pos:match.start()])
+
+        pos = match.end()
+
+        if match.group("start_tag"):
+            token = HTMLToken(HTMLToken.START_TAG, match.group(), match.group("start_name"))
+            yield token
+
+            if token.name in RAW_TEXT_ELEMENTS and not token.is_self_closing:
+                end_match = re.compile(r"</%s\s*>" % token.name, re.I).search(doc, pos)
+                raw_end = end_match.start() if end_match else length
+                if raw_end > pos:
+                    yield HTMLToken(HTMLToken.TEXT, doc[pos:raw_end])
+                pos = raw_end
+        elif match.group("end_tag"):
+            yield HTMLToken(HTMLToken.END_TAG, match.group(), match.group("end_name"))
+        else:
+            yield HTMLToken(HTMLToken.TEXT, match.group())
+
+
+class StoryHTMLTransformer:
+    """
+    Base class for rewrites applied to a story document by ``StoryHTMLProcessor``.
+
+    ``handle_token`` is called for every token of the document, in order. ``open_tags`` holds the
+    names of the elements enclosing the token, so for an end tag it no longer includes the
+    element being closed.
+    """
+
+    def handle_token(self, token, open_tags):
+        pass
+
+
+class StoryHTMLProcessor:
+    """
+    Applies a list of transformers to a document in one tokenizer pass
+    """
+
+    def __init__(self, transformers):
+        self.transformers = transformers
+
+    def process(self, doc):
+        if not doc or not self.transformers:
+            return doc
+
+        open_tags = []
+        output = []
+
+        for token in tokenize(doc):
+            if token.kind == HTMLToken.END_TAG and token.name in open_tags:
+                # close any element left open inside this one
+                while open_tags.pop() != token.name:
+                    pass
+
+            for transformer in self.transformers:
+                transformer.handle_token(token, open_tags)
+
+            if token.opens_element:
+                open_tags.append(token.name)
+
+            output.append(token.render())
+
+        return "".join(output)
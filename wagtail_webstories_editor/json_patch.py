@@ -0,0 +1,155 @@
+"""
+Minimal implementation of JSON Patch (RFC 6902), and of text splices, used to apply the incremental
+story saves of the editor
+"""
+import copy
+
+
+class JSONPatchError(ValueError):
+    pass
+
+
+def parse_pointer(pointer):
+    if not isinstance(pointer, str):
+        raise JSONPatchError("Invalid JSON pointer '%s'" % (pointer,))
+
+    if pointer == "":
+        return []
+
+    if not pointer.startswith("/"):
+        raise JSONPatchError("Invalid JSON pointer '%s'" % pointer)
+
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+
+def get_array_index(array, token, allow_end=False):
+    if allow_end and token == "-":
+        return len(array)
+
+    if not token.isdigit() or (token != "0" and token.startswith("0")):
+        raise JSONPatchError("Invalid array index '%s'" % token)
+
+    index = int(token)
+    if index > len(array) or (index == len(array) and not allow_end):
+        raise JSONPatchError("Array index '%s' out of range" % token)
+
+    return index
+
+
+def resolve(doc, tokens):
+    for token in tokens:
+        if isinstance(doc, dict):
+            if token not in doc:
+                raise JSONPatchError("Member '%s' not found" % token)
+            doc = doc[token]
+        elif isinstance(doc, list):
+            doc = doc[get_array_index(doc, token)]
+        else:
+            raise JSONPatchError("Cannot resolve '%s' in a scalar value" % token)
+
+    return doc
+
+
+def add_value(doc, tokens, value):
+    if not tokens:
+        return value
+
+    parent = resolve(doc, tokens[:-1])
+    token = tokens[-1]
+
+    if isinstance(parent, dict):
+        parent[token] = value
+    elif isinstance(parent, list):
+        parent.insert(get_array_index(parent, token, allow_end=True), value)
+    else:
+        raise JSONPatchError("Cannot add '%s' to a scalar value" % token)
+
+    return doc
+
+
+def remove_value(doc, tokens):
+    if not tokens:
+        raise JSONPatchError("Cannot remove the whole document")
+
+    parent = resolve(doc, tokens[:-1])
+    token = tokens[-1]
+
+    if isinstance(parent, dict):
+        if token not in parent:
+            raise JSONPatchError("Member '%s' not found" % token)
+        return parent.pop(token)
+
+    if isinstance(parent, list):
+        return parent.pop(get_array_index(parent, token))
+
+    raise JSONPatchError("Cannot remove '%s' from a scalar value" % token)
+
+
+def apply_json_patch(doc, operations):
+    """
+    Returns a copy of ``doc`` with the patch ``operations`` applied. The operations are applied atomically:
+    a ``JSONPatchError`` is raised, and ``doc`` left untouched, if any of them fails.
+    """
+    if not isinstance(operations, list):
+        raise JSONPatchError("A JSON patch must be a list of operations")
+
+    doc = copy.deepcopy(doc)
+
+    for operation in operations:
+        if not isinstance(operation, dict):
+            raise JSONPatchError("Invalid operation '%s'" % operation)
+
+        op = operation.get("op")
+        tokens = parse_pointer(operation.get("path", ""))
+
+        if op in ["add", "replace", "test"] and "value" not in operation:
+            raise JSONPatchError("Missing value for the '%s' operation" % op)
+
+        if op == "add":
+            doc = add_value(doc, tokens, operation["value"])
+        elif op == "remove":
+            remove_value(doc, tokens)
+        elif op == "replace":
+            if tokens:
+                remove_value(doc, tokens)
+            doc = add_value(doc, tokens, operation["value"])
+        elif op in ["move", "copy"]:
+            from_tokens = parse_pointer(operation.get("from", ""))
+            if op == "move":
+                if tokens[:len(from_tokens)] == from_tokens and tokens != from_tokens:
+                    raise JSONPatchError("Cannot move a value into one of its children")
+                value = remove_value(doc, from_tokens)
+            else:
+                value = copy.deepcopy(resolve(doc, from_tokens))
+            doc = add_value(doc, tokens, value)
+        elif op == "test":
+            if resolve(doc, tokens) != operation["value"]:
+                raise JSONPatchError("Test failed for '%s'" % operation.get("path"))
+        else:
+            raise JSONPatchError("Unknown operation '%s'" % op)
+
+    return doc
+
+
+def apply_text_splice(text, splice):
+    """
+    Replace the ``start:end`` range of ``text`` with ``splice["text"]``. Offsets are in UTF-16 code units,
+    as computed by the browser, and ``splice["length"]`` must match the length of ``text``.
+    """
+    try:
+        start, end, length, new_text = splice["start"], splice["end"], splice["length"], splice["text"]
+    except (KeyError, TypeError):
+        raise JSONPatchError("Invalid text splice")
+
+    if not all(isinstance(offset, int) for offset in (start, end, length)) or not isinstance(new_text, str):
+        raise JSONPatchError("Invalid text splice")
+
+    encoded = text.encode("utf-16-le")
+
+    if length != len(encoded) // 2 or not 0 <= start <= end <= length:
+        raise JSONPatchError("Text splice out of range")
+
+    try:
+        return (encoded[:start * 2] + new_text.encode("utf-16-le") + encoded[end * 2:]).decode("utf-16-le")
+    except UnicodeDecodeError:
+        raise JSONPatchError("Text splice splits a character")
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from wagtail_webstories_editor.cache import invalidate_story_response_cache
+from wagtail_webstories_editor.models import WebStory, WebStoryCompressedHTML
+
+
+class Command(BaseCommand):
+    help = "Generate the gzip and brotli variants of the published html of live web stories"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Regenerate the variants even if they are up to date",
+        )
+
+    def handle(self, *args, **options):
+        stories = WebStory.objects.for_render().filter(live=True).select_related("compressed_html").order_by("pk")
+
+        compressed_count = 0
+
+        for story in stories.iterator(chunk_size=100):
+            compressed_html = getattr(story, "compressed_html", None)
+
+            if (not options["force"] and compressed_html and compressed_html.content_hash
+                    and compressed_html.revision_id == story.live_revision_id):
+                continue
+
+            if WebStoryCompressedHTML.update_for_story(story) is None:
+                self.stderr.write("There is no live listing page to render the stories")
+                return
+
+            invalidate_story_response_cache(story.pk)
+            compressed_count += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Compressed the html of {compressed_count} live web stories"))
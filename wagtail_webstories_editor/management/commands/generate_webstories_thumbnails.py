@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from wagtail.images import get_image_model
+
+from wagtail_webstories_editor.renditions import enqueue_editor_renditions, generate_editor_renditions
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate the thumbnail renditions shown by the media library of the editor, for images uploaded "
+        "before they were generated on save"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--enqueue", action="store_true",
+                            help="Enqueue the generation with django-tasks instead of generating them here")
+        parser.add_argument("--start-after", type=int, default=0, help="Resume after the image with this id")
+
+    def handle(self, *args, **options):
+        images = get_image_model().objects.filter(pk__gt=options["start_after"]).order_by("pk")
+
+        image_count = 0
+
+        for image_id in images.values_list("pk", flat=True).iterator(chunk_size=500):
+            if options["enqueue"]:
+                enqueue_editor_renditions(image_id)
+            else:
+                generate_editor_renditions(image_id)
+
+            image_count += 1
+
+            if image_count % 100 == 0:
+                self.stdout.write(f"Processed images up to id {image_id}")
+
+        action = "Enqueued" if options["enqueue"] else "Generated"
+        self.stdout.write(self.style.SUCCESS(f"{action} the editor thumbnails of {image_count} images"))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from wagtail_webstories_editor.video_optimization import (
+    enqueue_video_optimization,
+    get_ffmpeg_path,
+    get_videos_to_optimize,
+    optimize_video
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Transcode videos to the web-optimized variants served to the editor and to readers of published stories, "
+        "for videos uploaded before enabling video optimization or whose variants are stale"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--enqueue", action="store_true",
+                            help="Enqueue the transcoding with django-tasks instead of transcoding here")
+        parser.add_argument("--start-after", type=int, default=0, help="Resume after the video with this id")
+
+    def handle(self, *args, **options):
+        if get_ffmpeg_path() is None:
+            raise CommandError("ffmpeg is not installed, set WAGTAIL_WEBSTORIES_EDITOR_FFMPEG to its path")
+
+        videos = get_videos_to_optimize().filter(pk__gt=options["start_after"]).order_by("pk")
+
+        video_count = 0
+
+        for media_id in videos.values_list("pk", flat=True).iterator(chunk_size=500):
+            if options["enqueue"]:
+                enqueue_video_optimization([media_id])
+            else:
+                optimize_video(media_id)
+                self.stdout.write(f"Processed video {media_id}")
+
+            video_count += 1
+
+        action = "Enqueued" if options["enqueue"] else "Optimized"
+        self.stdout.write(self.style.SUCCESS(f"{action} {video_count} videos"))
@@ -0,0 +1,87 @@
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db.models import Sum, TextField
+from django.db.models.functions import Cast, Length
+from django.utils import timezone
+from wagtail.models import Revision
+
+from wagtail_webstories_editor.models import WebStory
+from wagtail_webstories_editor.revision_retention import (
+    get_protected_revision_ids,
+    get_revision_retention_policy,
+    get_revisions_to_prune,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete old web story revisions according to the retention policy. Stories are processed in chunks, "
+        "in order of id, and revisions are deleted in small batches, so the command can be interrupted "
+        "and resumed with --start-after."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--keep-last", type=int, help="Number of recent revisions to always keep")
+        parser.add_argument("--keep-hourly-days", type=int, help="Keep one revision per hour for this many days")
+        parser.add_argument("--keep-daily-days", type=int, help="Then keep one revision per day for this many days")
+        parser.add_argument("--chunk-size", type=int, default=50, help="Number of stories processed at once")
+        parser.add_argument("--batch-size", type=int, default=200, help="Number of revisions deleted at once")
+        parser.add_argument("--start-after", type=int, default=0, help="Resume after the story with this id")
+        parser.add_argument("--dry-run", action="store_true", help="Report what would be deleted, without deleting")
+
+    def handle(self, *args, **options):
+        policy = get_revision_retention_policy(
+            keep_last=options["keep_last"],
+            keep_hourly_days=options["keep_hourly_days"],
+            keep_daily_days=options["keep_daily_days"],
+        )
+        content_type = ContentType.objects.get_for_model(WebStory)
+        now = timezone.now()
+
+        pruned_count = 0
+        reclaimed_bytes = 0
+        last_story_id = options["start_after"]
+
+        while True:
+            stories = list(
+                WebStory.objects.summary().filter(pk__gt=last_story_id).order_by("pk")[:options["chunk_size"]]
+            )
+            if not stories:
+                break
+
+            protected_ids = get_protected_revision_ids(stories)
+
+            revisions_by_story = defaultdict(list)
+            revisions = Revision.objects.filter(
+                base_content_type=content_type,
+                object_id__in=[str(story.pk) for story in stories],
+            ).values_list("pk", "object_id", "created_at")
+
+            for pk, object_id, created_at in revisions.iterator():
+                revisions_by_story[object_id].append((pk, created_at))
+
+            to_prune = []
+            for story_revisions in revisions_by_story.values():
+                to_prune.extend(get_revisions_to_prune(story_revisions, protected_ids, policy, now))
+
+            for start in range(0, len(to_prune), options["batch_size"]):
+                batch = Revision.objects.filter(pk__in=to_prune[start:start + options["batch_size"]])
+
+                reclaimed_bytes += batch.aggregate(
+                    size=Sum(Length(Cast("content", output_field=TextField())))
+                )["size"] or 0
+
+                if not options["dry_run"]:
+                    batch.delete()
+
+            pruned_count += len(to_prune)
+            last_story_id = stories[-1].pk
+
+            self.stdout.write(f"Processed stories up to id {last_story_id}, {pruned_count} revisions pruned so far")
+
+        action = "Would prune" if options["dry_run"] else "Pruned"
+        self.stdout.write(self.style.SUCCESS(
+            f"{action} {pruned_count} web story revisions, reclaiming about {reclaimed_bytes / 1024 / 1024:.1f} MB"
+        ))
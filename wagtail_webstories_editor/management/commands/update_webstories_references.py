@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from wagtail_webstories_editor.models import WebStory, WebStoryReference
+
+
+class Command(BaseCommand):
+    help = "Extract the images, media, documents, fonts and element types used by web stories from their config"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start-after", type=int, default=0, help="Resume after the story with this id")
+
+    def handle(self, *args, **options):
+        stories = WebStory.objects.for_editor().filter(pk__gt=options["start_after"]).order_by("pk")
+
+        updated_count = 0
+
+        for story in stories.iterator(chunk_size=100):
+            if story.live:
+                WebStoryReference.update_for_story(story, live=True)
+            else:
+                WebStoryReference.delete_for_story(story, live=True)
+
+            # the story row holds the live version, drafts are in the latest revision
+            latest_revision = story.get_latest_revision_as_object() if story.has_unpublished_changes else story
+            WebStoryReference.update_for_story(latest_revision, live=False)
+
+            updated_count += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Updated the references of {updated_count} web stories"))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from wagtail_webstories_editor.models import WebStory
+
+
+class Command(BaseCommand):
+    help = "Extract the poster, featured media, page count and search text of web stories from their config"
+
+    def handle(self, *args, **options):
+        stories = WebStory.objects.for_editor().order_by("pk")
+
+        updated_count = 0
+
+        for story in stories.iterator(chunk_size=100):
+            story.update_summary_fields()
+            WebStory.objects.filter(pk=story.pk).update(
+                featured_media_url=story.featured_media_url,
+                poster_url=story.poster_url,
+                page_count=story.page_count,
+                search_text=story.search_text,
+            )
+            updated_count += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Updated the summary of {updated_count} web stories"))
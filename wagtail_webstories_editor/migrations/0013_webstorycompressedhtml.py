@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wagtail_webstories_editor', '0012_alter_webstory_slug'),
+        ('wagtailcore', '0089_log_entry_data_json_null_to_object'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebStoryCompressedHTML',
+            fields=[
+                ('story', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='compressed_html', serialize=False, to='wagtail_webstories_editor.webstory')),
+                ('gzip', models.BinaryField(blank=True, null=True)),
+                ('brotli', models.BinaryField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('revision', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='wagtailcore.revision')),
+            ],
+            options={
+                'verbose_name': 'Web Story Compressed HTML',
+            },
+        ),
+    ]
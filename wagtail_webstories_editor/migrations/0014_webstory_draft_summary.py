@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:25
+
+import json
+
+from django.db import migrations, models
+
+
+def populate_draft_summary(apps, schema_editor):
+    WebStory = apps.get_model("wagtail_webstories_editor", "WebStory")
+
+    for story in WebStory.objects.select_related("latest_revision").iterator(chunk_size=100):
+        revision = story.latest_revision
+        content = revision.content if revision else {}
+
+        config = content.get("config", story.config)
+        if isinstance(config, str):
+            config = json.loads(config)
+
+        featured_media = (config or {}).get("featuredMedia") or {}
+
+        story.draft_title = content.get("title", story.title) or ""
+        story.draft_featured_media_url = featured_media.get("url") or None
+        story.latest_revision_created_at = revision.created_at if revision else None
+        story.save(update_fields=["draft_title", "draft_featured_media_url", "latest_revision_created_at"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wagtail_webstories_editor', '0013_webstorycompressedhtml'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='webstory',
+            name='draft_featured_media_url',
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='webstory',
+            name='draft_title',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='webstory',
+            name='latest_revision_created_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.RunPython(populate_draft_summary, migrations.RunPython.noop),
+    ]
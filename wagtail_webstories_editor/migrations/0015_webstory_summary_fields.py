@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:27
+
+from django.db import migrations, models
+
+from wagtail_webstories_editor.utils import get_story_summary
+
+
+def populate_summary_fields(apps, schema_editor):
+    WebStory = apps.get_model("wagtail_webstories_editor", "WebStory")
+
+    for story in WebStory.objects.defer("html").iterator(chunk_size=100):
+        summary = get_story_summary(story.config)
+
+        story.featured_media_url = summary["featured_media_url"]
+        story.poster_url = summary["poster_url"]
+        story.page_count = summary["page_count"]
+        story.save(update_fields=["featured_media_url", "poster_url", "page_count"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wagtail_webstories_editor', '0014_webstory_draft_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='webstory',
+            name='featured_media_url',
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='webstory',
+            name='page_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='webstory',
+            name='poster_url',
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='webstory',
+            index=models.Index(fields=['live', '-last_published_at'], name='webstory_live_published_idx'),
+        ),
+        migrations.RunPython(populate_summary_fields, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:41
+
+from django.db import migrations, models
+
+
+def keep_single_default_logo(apps, schema_editor):
+    WebStoriesPublisherLogo = apps.get_model("wagtail_webstories_editor", "WebStoriesPublisherLogo")
+
+    seen_settings = set()
+    for logo in WebStoriesPublisherLogo.objects.filter(default=True).order_by("setting_id", "sort_order", "pk"):
+        if logo.setting_id in seen_settings:
+            WebStoriesPublisherLogo.objects.filter(pk=logo.pk).update(default=False)
+        seen_settings.add(logo.setting_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wagtail_webstories_editor', '0015_webstory_summary_fields'),
+    ]
+
+    operations = [
+        migrations.RunPython(keep_single_default_logo, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='webstoriespublisherlogo',
+            constraint=models.UniqueConstraint(condition=models.Q(('default', True)), fields=('setting',), name='unique_default_publisher_logo'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:50
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wagtail_webstories_editor', '0016_publisher_logo_unique_default'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='webstory',
+            index=models.Index(models.OrderBy(django.db.models.functions.comparison.Coalesce('last_published_at', 'created_at'), descending=True), models.OrderBy(models.F('id'), descending=True), name='webstory_published_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='webstory',
+            index=models.Index(models.OrderBy(django.db.models.functions.comparison.Coalesce('latest_revision_created_at', 'created_at'), descending=True), models.OrderBy(models.F('id'), descending=True), name='webstory_modified_id_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:51
+
+import json
+
+from django.db import migrations, models
+
+from wagtail_webstories_editor.revision_codecs import decode_revision_content
+from wagtail_webstories_editor.utils import get_story_text
+
+
+def populate_search_text(apps, schema_editor):
+    WebStory = apps.get_model("wagtail_webstories_editor", "WebStory")
+
+    for story in WebStory.objects.defer("html").select_related("latest_revision").iterator(chunk_size=100):
+        revision = story.latest_revision
+        content = decode_revision_content(revision.content) if revision else {}
+
+        config = content.get("config", story.config)
+        if isinstance(config, str):
+            config = json.loads(config)
+
+        story.search_text = get_story_text(story.config)
+        story.draft_search_text = get_story_text(config)
+        story.save(update_fields=["search_text", "draft_search_text"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wagtail_webstories_editor', '0017_webstory_dashboard_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='webstory',
+            name='draft_search_text',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='webstory',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(populate_search_text, migrations.RunPython.noop),
+    ]
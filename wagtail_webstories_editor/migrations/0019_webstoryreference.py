@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wagtail_webstories_editor', '0018_webstory_search_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebStoryReference',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('live', models.BooleanField(default=False)),
+                ('kind', models.CharField(max_length=20)),
+                ('object_id', models.IntegerField(blank=True, null=True)),
+                ('name', models.CharField(blank=True, default='', max_length=255)),
+                ('story', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='references', to='wagtail_webstories_editor.webstory')),
+            ],
+            options={
+                'verbose_name': 'Web Story Reference',
+                'indexes': [models.Index(fields=['kind', 'object_id'], name='webstory_reference_object_idx'), models.Index(fields=['kind', 'name'], name='webstory_reference_name_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+from wagtailmedia.settings import wagtailmedia_settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wagtail_webstories_editor', '0019_webstoryreference'),
+        ('wagtailmedia', '0004_duration_optional_floatfield'),
+        migrations.swappable_dependency(wagtailmedia_settings.MEDIA_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='webstoriessetting',
+            name='media_optimization',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='WebStoryMediaVariant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('format', models.CharField(max_length=10)),
+                ('file', models.FileField(upload_to='webstories_media_variants')),
+                ('width', models.IntegerField(blank=True, null=True)),
+                ('height', models.IntegerField(blank=True, null=True)),
+                ('source_name', models.CharField(max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('media', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='optimized_variants', to=wagtailmedia_settings.MEDIA_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Web Story Media Variant',
+                'constraints': [models.UniqueConstraint(fields=('media', 'format'), name='unique_webstory_media_variant')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wagtail_webstories_editor', '0020_webstorymediavariant'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='webstorycompressedhtml',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
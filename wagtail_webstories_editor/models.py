@@ -1,8 +1,13 @@
 import json
+import re
+from datetime import timedelta
 
 from django.contrib.contenttypes.fields import GenericRelation
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import Coalesce
+from django.dispatch import Signal
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from modelcluster.fields import ParentalKey
 from modelcluster.models import ClusterableModel
@@ -10,15 +15,44 @@ from wagtail.admin.admin_url_finder import AdminURLFinder
 from wagtail.admin.panels import FieldPanel, PublishingPanel, InlinePanel
 from wagtail.contrib.routable_page.models import RoutablePageMixin, path
 from wagtail.contrib.settings.models import BaseSiteSetting
+from wagtail.search import index
+from wagtail.search.queryset import SearchableQuerySetMixin
 from wagtail.models import (
     DraftStateMixin,
     LockableMixin,
     RevisionMixin,
     WorkflowMixin,
-    PreviewableMixin, Page, Orderable
+    PreviewableMixin, Page, Orderable, Revision, ModelLogEntry
 )
+from wagtailmedia.settings import wagtailmedia_settings
 
 from wagtail_webstories_editor import get_webstories_listing_page_model
+from wagtail_webstories_editor.background import enqueue, task
+from wagtail_webstories_editor.cache import (
+    claim_story_compression,
+    get_cached_story_response,
+    get_story_response_generation,
+    get_listing_page_url,
+    get_setting_cache_key,
+    get_setting_cache_timeout,
+    get_webstories_cache,
+    cache_story_response,
+    invalidate_story_response_cache,
+    story_response_from_cache_entry
+)
+from wagtail_webstories_editor.compression import compress_story_html, get_content_hash
+from wagtail_webstories_editor.forms import WebStoriesSettingForm
+from wagtail_webstories_editor.revision_codecs import encode_revision_content, decode_revision_content
+from wagtail_webstories_editor.revision_retention import get_revision_coalesce_window
+from wagtail_webstories_editor.utils import (
+    get_story_references,
+    get_story_summary,
+    get_story_sitemap_urls,
+    get_story_text
+)
+
+# threads compressing story html in each process, when django-tasks is not installed
+STORY_COMPRESSION_WORKERS = 1
 
 
 class WebStoriesSetting(ClusterableModel, BaseSiteSetting):
@@ -26,6 +60,7 @@ class WebStoriesSetting(ClusterableModel, BaseSiteSetting):
                                            verbose_name=_("Google Analytics Measurement ID"))
     using_legacy_analytics = models.BooleanField(default=False)
     video_cache = models.BooleanField(default=False)
+    media_optimization = models.BooleanField(default=False)
     auto_advance = models.BooleanField(default=False)
     default_page_duration = models.IntegerField(default=7, blank=True, null=True)
 
@@ -33,17 +68,55 @@ class WebStoriesSetting(ClusterableModel, BaseSiteSetting):
         FieldPanel("google_analytics_id"),
         FieldPanel("using_legacy_analytics"),
         FieldPanel("video_cache"),
+        FieldPanel("media_optimization"),
         FieldPanel("auto_advance"),
         FieldPanel("default_page_duration"),
         InlinePanel("publisher_logos", heading=_("Publisher Logos"), label=_("Logo"))
     ]
 
+    base_form_class = WebStoriesSettingForm
+
+    def save(self, *args, **kwargs):
+        if self.pk:
+            # logos are saved one at a time after the setting. Unset the previous default first, so that moving the
+            # default to an earlier logo does not clash with it
+            default_logo_ids = [logo.pk for logo in self.publisher_logos.all() if logo.default and logo.pk]
+            WebStoriesPublisherLogo.objects.filter(setting_id=self.pk, default=True).exclude(
+                pk__in=default_logo_ids).update(default=False)
+
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def base_queryset(cls):
+        return super().base_queryset().prefetch_related("publisher_logos__logo")
+
+    @classmethod
+    def for_site(cls, site):
+        """
+        Get or create the setting for the site, with its publisher logos. It is cached across requests for a few
+        minutes, and dropped whenever the setting, its logos or their images are saved.
+        """
+        if site is None:
+            return super().for_site(site)
+
+        cache = get_webstories_cache()
+        cache_key = get_setting_cache_key(site.pk)
+
+        instance = cache.get(cache_key)
+
+        if instance is None:
+            instance = super().for_site(site)
+            cache.set(cache_key, instance, get_setting_cache_timeout())
+
+        return instance
+
     @property
     def config(self):
         return {
             "googleAnalyticsId": self.google_analytics_id,
             "usingLegacyAnalytics": self.using_legacy_analytics,
             "videoCache": self.video_cache,
+            "mediaOptimization": self.media_optimization,
             "autoAdvance": self.auto_advance,
             "defaultPageDuration": self.default_page_duration,
         }
@@ -61,14 +134,81 @@ class WebStoriesPublisherLogo(Orderable):
     )
     default = models.BooleanField(default=False)
 
+    class Meta(Orderable.Meta):
+        constraints = [
+            models.UniqueConstraint(fields=["setting"], condition=models.Q(default=True),
+                                    name="unique_default_publisher_logo"),
+        ]
+
+
+SLUG_ALLOCATION_ATTEMPTS = 5
+
+# suffix added to a slug taken by another story
+SLUG_SUFFIX_RE = re.compile(r"-\d+$")
+
+
+class WebStoryQuerySet(SearchableQuerySetMixin, models.QuerySet):
+    """
+    ``config`` and ``html`` can each be several megabytes, so only load the ones that are needed
+    """
+
+    def summary(self):
+        return self.defer("config", "html", "search_text", "draft_search_text")
 
-class WebStory(WorkflowMixin, DraftStateMixin, LockableMixin, RevisionMixin, PreviewableMixin, models.Model):
+    def for_render(self):
+        return self.defer("config")
+
+    def for_editor(self):
+        return self.defer("html")
+
+    def referencing(self, kind, object_id=None, name=None, live=None):
+        """
+        Stories using an asset, e.g. ``referencing("image", 123)`` or ``referencing("font", name="Roboto")``.
+        Pass ``live=True`` to only look at the live version of stories, ``live=False`` at their latest revision.
+        """
+        references = WebStoryReference.objects.filter(kind=kind)
+
+        if object_id is not None:
+            references = references.filter(object_id=object_id)
+        if name is not None:
+            references = references.filter(name=name)
+        if live is not None:
+            references = references.filter(live=live)
+
+        return self.filter(pk__in=references.values("story_id"))
+
+    def search_live(self, query):
+        """
+        Search the live stories by their title and text, for site searches
+        """
+        return self.summary().filter(live=True).search(query)
+
+
+class WebStory(WorkflowMixin, DraftStateMixin, LockableMixin, RevisionMixin, PreviewableMixin, index.Indexed,
+               models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     title = models.CharField(max_length=255, default="Untitled", verbose_name=_("Title"))
     slug = models.CharField(max_length=255, blank=True, null=True, unique=True)
     config = models.JSONField(blank=True, null=True)
     html = models.TextField(blank=True, null=True)
 
+    # extracted from config on save, so that listings do not need to load config
+    featured_media_url = models.TextField(blank=True, null=True, editable=False)
+    poster_url = models.TextField(blank=True, null=True, editable=False)
+    page_count = models.PositiveIntegerField(default=0, editable=False)
+
+    # summary of the latest revision, kept up to date on each save_revision for the dashboard
+    draft_title = models.CharField(max_length=255, default="", editable=False)
+    draft_featured_media_url = models.TextField(blank=True, null=True, editable=False)
+    latest_revision_created_at = models.DateTimeField(null=True, editable=False)
+
+    # text of the live and of the latest revision, extracted from config on save, so that searches do not
+    # need to load config
+    search_text = models.TextField(blank=True, default="", editable=False)
+    draft_search_text = models.TextField(blank=True, default="", editable=False)
+
+    objects = WebStoryQuerySet.as_manager()
+
     _revisions = GenericRelation("wagtailcore.Revision", related_query_name="web_story")
     workflow_states = GenericRelation(
         "wagtailcore.WorkflowState",
@@ -82,6 +222,24 @@ class WebStory(WorkflowMixin, DraftStateMixin, LockableMixin, RevisionMixin, Pre
         verbose_name = _("Web Story")
         verbose_name_plural = _("Web Stories")
         ordering = ["first_published_at", ]
+        indexes = [
+            models.Index(fields=["live", "-last_published_at"], name="webstory_live_published_idx"),
+            # the keys the dashboard sorts and paginates stories on
+            models.Index(Coalesce("last_published_at", "created_at").desc(), models.F("id").desc(),
+                         name="webstory_published_id_idx"),
+            models.Index(Coalesce("latest_revision_created_at", "created_at").desc(), models.F("id").desc(),
+                         name="webstory_modified_id_idx"),
+        ]
+
+    # only the live text is indexed, drafts must not be found by site searches
+    search_auto_update = False  # see update_search_index_on_save
+    search_fields = [
+        index.SearchField("title", boost=2),
+        index.AutocompleteField("title"),
+        index.SearchField("search_text"),
+        index.FilterField("id"),
+        index.FilterField("live"),
+    ]
 
     panels = [
         FieldPanel("title"),
@@ -96,43 +254,216 @@ class WebStory(WorkflowMixin, DraftStateMixin, LockableMixin, RevisionMixin, Pre
 
     @property
     def poster_image_url(self):
-        try:
-            featured_media = self.config.get("featuredMedia")
-            if featured_media and featured_media.get("url"):
-                return featured_media.get("url")
+        return self.poster_url
+
+    def update_summary_fields(self):
+        summary = get_story_summary(self.config)
+
+        self.featured_media_url = summary["featured_media_url"]
+        self.poster_url = summary["poster_url"]
+        self.page_count = summary["page_count"]
+        self.search_text = get_story_text(self.config)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+
+        if update_fields is None or "config" in update_fields:
+            self.update_summary_fields()
+            if update_fields is not None:
+                kwargs["update_fields"] = set(update_fields) | {
+                    "featured_media_url", "poster_url", "page_count", "search_text"
+                }
+
+        if not self.slug or (update_fields is not None and "slug" not in update_fields):
+            super().save(*args, **kwargs)
+            return
+
+        # another story can take the slug between full_clean and save, in which case allocate a new one
+        for attempt in range(SLUG_ALLOCATION_ATTEMPTS):
+            try:
+                with transaction.atomic():
+                    super().save(*args, **kwargs)
+                return
+            except IntegrityError:
+                if attempt == SLUG_ALLOCATION_ATTEMPTS - 1 or self.slug_is_available(self.slug):
+                    raise
+                self.slug = self.get_available_slug(self.get_base_slug())
+
+    def get_slug_siblings(self):
+        siblings = WebStory.objects.summary()
 
-            pages = self.config.get("storyData", {}).get("pages")
+        if self.pk:
+            siblings = siblings.exclude(pk=self.pk)
 
-            for page in pages:
-                elements = page.get("elements")
-                for element in elements:
-                    if element.get("type") == "image":
-                        return element.get("resource").get("src")
+        return siblings
 
-        except Exception:
-            pass
+    def slug_is_available(self, candidate_slug):
+        return not self.get_slug_siblings().filter(slug=candidate_slug).exists()
 
-        return None
+    def get_base_slug(self):
+        """
+        The slug asked for in ``full_clean``, or else the current slug without the suffix of a previous allocation,
+        as when publishing, which skips ``full_clean``
+        """
+        return getattr(self, "_base_slug", None) or SLUG_SUFFIX_RE.sub("", self.slug)
 
-    def slug_is_available(self, candidate_slug):
-        siblings = WebStory.objects.all()
+    def get_available_slug(self, base_slug):
+        """
+        Returns ``base_slug``, or ``base_slug-N`` with the lowest free N, in a single query
+        """
+        taken_slugs = set(
+            self.get_slug_siblings()
+            .filter(models.Q(slug=base_slug) | models.Q(slug__startswith=base_slug + "-"))
+            .values_list("slug", flat=True)
+        )
 
-        if self.pk:
-            siblings = siblings.exclude(pk=self.pk)
+        if base_slug not in taken_slugs:
+            return base_slug
+
+        suffix = 2
+        while "%s-%d" % (base_slug, suffix) in taken_slugs:
+            suffix += 1
 
-        return not siblings.filter(slug=candidate_slug).exists()
+        return "%s-%d" % (base_slug, suffix)
 
     def full_clean(self, *args, **kwargs):
-        candidate_slug = self.slug
-        if candidate_slug:
-            suffix = 1
-            while not self.slug_is_available(candidate_slug):
-                suffix += 1
-                candidate_slug = "%s-%d" % (self.slug, suffix)
-        self.slug = candidate_slug
+        if self.slug:
+            self._base_slug = self.slug
+            self.slug = self.get_available_slug(self.slug)
 
         super().full_clean(*args, **kwargs)
 
+    def save_revision(self, *args, **kwargs):
+        # make sure the revision content carries up to date summary fields
+        self.update_summary_fields()
+        return super().save_revision(*args, **kwargs)
+
+    def get_revision_to_coalesce(self, user, window):
+        """
+        The latest revision, if a save by ``user`` can update it in place instead of creating a new revision.
+        That is the case when the user created it less than ``window`` seconds ago, it is not live or scheduled,
+        and nothing else happened to the story since (publishing, locking, moderation...)
+        """
+        if not window or not user or not self.latest_revision_id or self.latest_revision_id == self.live_revision_id:
+            return None
+
+        revision = Revision.objects.defer("content").filter(
+            pk=self.latest_revision_id,
+            user=user,
+            approved_go_live_at__isnull=True,
+            created_at__gte=timezone.now() - timedelta(seconds=window),
+        ).first()
+
+        if revision is None:
+            return None
+
+        other_events = ModelLogEntry.objects.filter(
+            content_type_id=revision.content_type_id,
+            object_id=str(self.pk),
+            timestamp__gte=revision.created_at,
+        ).exclude(action="wagtail.edit", revision=revision)
+
+        if other_events.exists():
+            return None
+
+        return revision
+
+    def save_draft_revision(self, user, autosave=False):
+        """
+        Save a revision of the current draft, updating the latest revision instead when
+        ``WAGTAIL_WEBSTORIES_EDITOR_REVISION_COALESCE_WINDOW`` allows it
+        """
+        revision = self.get_revision_to_coalesce(user, get_revision_coalesce_window(autosave))
+
+        if revision:
+            return self.update_revision(revision)
+
+        return self.save_revision(user=user)
+
+    def update_revision(self, revision, clean=True):
+        """
+        Overwrite the content of an existing revision with the current state of the story
+        """
+        if clean:
+            self.full_clean()
+
+        self.update_summary_fields()
+
+        Revision.objects.filter(pk=revision.pk).update(content=self.serializable_data(), object_str=str(self))
+        # the revision keeps its creation date, which bounds the coalescing window, but the story was modified now
+        self._update_from_revision(revision, modified_at=timezone.now())
+
+        return revision
+
+    def get_latest_revision_as_object(self):
+        latest_revision = self.get_latest_revision()
+
+        if self.has_unpublished_changes and latest_revision:
+            # reuse this instance, instead of letting the revision load the story again with config and html
+            latest_revision.content_object = self
+
+        return super().get_latest_revision_as_object()
+
+    def serializable_data(self):
+        content = super().serializable_data()
+
+        # the search text is extracted from config again when a revision is restored or published
+        content.pop("search_text", None)
+        content.pop("draft_search_text", None)
+
+        return encode_revision_content(content)
+
+    def with_content_json(self, content):
+        content = decode_revision_content(content)
+
+        # revision foreign keys are taken from this instance, checking the ones in content
+        # would load whole revisions, with their config and html
+        content = {key: value for key, value in content.items() if key not in ["latest_revision", "live_revision"]}
+
+        obj = super().with_content_json(content)
+        obj.live_revision_id = self.live_revision_id
+
+        # the draft summary describes the latest revision, not a specific one
+        obj.draft_title = self.draft_title
+        obj.draft_featured_media_url = self.draft_featured_media_url
+        obj.latest_revision_created_at = self.latest_revision_created_at
+        obj.draft_search_text = self.draft_search_text
+        obj.search_text = get_story_text(obj.config)
+
+        return obj
+
+    def _update_from_revision(self, revision, changed=True, modified_at=None):
+        update_fields = [
+            "latest_revision", "draft_title", "draft_featured_media_url", "latest_revision_created_at",
+            "draft_search_text"
+        ]
+
+        self.latest_revision = revision
+        self.draft_title = self.title
+        self.draft_featured_media_url = self.featured_media_url
+        self.latest_revision_created_at = modified_at or revision.created_at
+        self.draft_search_text = self.search_text
+
+        if changed:
+            self.has_unpublished_changes = True
+            update_fields.append("has_unpublished_changes")
+
+        self.save(update_fields=update_fields)
+
+        WebStoryReference.update_for_story(self, live=False)
+
+    @property
+    def draft_version(self):
+        """
+        Identifies the content of the latest revision. Unlike its id, it changes when a coalesced save updates the
+        revision in place, so incremental saves of the editor can tell whether they are still based on it.
+        """
+        if not self.latest_revision_id:
+            return None
+
+        modified_at = self.latest_revision_created_at.isoformat() if self.latest_revision_created_at else ""
+        return f"{self.latest_revision_id}:{modified_at}"
+
     @property
     def json_config(self):
         return json.dumps(self.config)
@@ -148,14 +479,11 @@ class WebStory(WorkflowMixin, DraftStateMixin, LockableMixin, RevisionMixin, Pre
         return {"story": self}
 
     def get_parent_link(self, request=None):
-        WebStoyListPage = get_webstories_listing_page_model()
-        if WebStoyListPage:
-            list_page = WebStoyListPage.objects.live().first()
-            return list_page.get_full_url(request)
-        return None
+        return get_listing_page_url(request)
 
-    def get_link(self, request=None):
-        parent_link = self.get_parent_link(request)
+    def get_link(self, request=None, parent_link=None):
+        if parent_link is None:
+            parent_link = self.get_parent_link(request)
         if parent_link:
             suffix = str(self.pk)
             if self.slug:
@@ -172,20 +500,23 @@ class WebStory(WorkflowMixin, DraftStateMixin, LockableMixin, RevisionMixin, Pre
 
         return ""
 
-    def get_story_dashboard_config(self, request=None):
-        finder = AdminURLFinder()
+    def get_story_dashboard_config(self, request=None, admin_url_finder=None, parent_link=None):
+        """
+        Story data for the dashboard, built from the draft summary fields so that the
+        latest revision does not need to be loaded.
+        Pass ``admin_url_finder`` and ``parent_link`` to share them between stories.
+        """
+        finder = admin_url_finder or AdminURLFinder()
         edit_url = finder.get_edit_url(self)
 
-        story = self.get_latest_revision_as_object()
-
         if request:
             edit_url = request.build_absolute_uri(edit_url)
 
-        created_at = story.last_published_at or story.created_at
+        created_at = self.last_published_at or self.created_at
 
         story_data = {
-            "id": story.pk,
-            "title": self.title,
+            "id": self.pk,
+            "title": self.draft_title or self.title,
             "created": created_at.strftime("%Y-%m-%dT%H:%M:%S"),
             "createdGmt": created_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
             "status": "publish" if self.live else "draft",
@@ -197,20 +528,15 @@ class WebStory(WorkflowMixin, DraftStateMixin, LockableMixin, RevisionMixin, Pre
             },
         }
 
-        try:
-            if story.config and story.config.get("featuredMedia"):
-                featuredMedia = story.config.get("featuredMedia")
-                if featuredMedia and featuredMedia.get("url"):
-                    story_data.update({"featuredMediaUrl": featuredMedia.get("url")})
-        except Exception:
-            pass
-
-        if self.latest_revision:
+        if self.draft_featured_media_url:
+            story_data.update({"featuredMediaUrl": self.draft_featured_media_url})
+
+        if self.latest_revision_created_at:
             story_data.update({
-                "modified": self.latest_revision.created_at.strftime("%Y-%m-%dT%H:%M:%SZ")
+                "modified": self.latest_revision_created_at.strftime("%Y-%m-%dT%H:%M:%SZ")
             })
 
-        link = self.get_link(request)
+        link = self.get_link(request, parent_link=parent_link)
 
         if self.live and link:
             story_data.update({
@@ -221,51 +547,218 @@ class WebStory(WorkflowMixin, DraftStateMixin, LockableMixin, RevisionMixin, Pre
         return story_data
 
 
+class WebStoryCompressedHTML(models.Model):
+    """
+    Pre-compressed variants of the published html of a story, generated when a revision goes live
+    """
+    story = models.OneToOneField(WebStory, on_delete=models.CASCADE, primary_key=True,
+                                 related_name="compressed_html")
+    revision = models.ForeignKey("wagtailcore.Revision", null=True, blank=True, on_delete=models.SET_NULL,
+                                 related_name="+")
+    # of the html that was compressed, which is only served compressed while it is rendered the same
+    content_hash = models.CharField(max_length=64, blank=True)
+    gzip = models.BinaryField(blank=True, null=True)
+    brotli = models.BinaryField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _("Web Story Compressed HTML")
+
+    def __str__(self):
+        return str(self.story)
+
+    @property
+    def encodings(self):
+        encodings = {}
+        if self.brotli:
+            encodings["br"] = bytes(self.brotli)
+        if self.gzip:
+            encodings["gzip"] = bytes(self.gzip)
+        return encodings
+
+    @classmethod
+    def update_for_story(cls, story, content=None):
+        """
+        Compress ``content``, the html served for the live revision of a story. Defaults to the html rendered by
+        the listing page outside of a request, which is replaced by the html actually served if the template of
+        the story renders it differently for readers. Returns None when there is no listing page to render it.
+        """
+        if content is None:
+            WebStoryListPage = get_webstories_listing_page_model()
+            list_page = WebStoryListPage.objects.live().first() if WebStoryListPage else None
+            if list_page is None:
+                return None
+
+            content = list_page.render_web_story(None, story).render().content
+
+        gzip_content, brotli_content = compress_story_html(content)
+
+        compressed_html, _ = cls.objects.update_or_create(story=story, defaults={
+            "revision_id": story.live_revision_id,
+            "content_hash": get_content_hash(content),
+            "gzip": gzip_content,
+            "brotli": brotli_content,
+        })
+
+        return compressed_html
+
+
+def update_compressed_story_html(story_id, revision_id, content=None, charset=None):
+    """
+    Update the compressed variants of a story, unless another revision went live meanwhile, and drop its cached
+    responses so that they are served. ``content`` is the html served for the revision, decoded with ``charset``.
+    """
+    stories = WebStory.objects.for_render().select_related("compressed_html")
+    story = stories.filter(pk=story_id, live=True, live_revision_id=revision_id).first()
+
+    if story is None:
+        return
+
+    compressed_html = getattr(story, "compressed_html", None)
+    if content is None and compressed_html and compressed_html.revision_id == revision_id:
+        # already compressed from the html served to readers
+        return
+
+    WebStoryCompressedHTML.update_for_story(story, content.encode(charset) if content is not None else None)
+    invalidate_story_response_cache(story.pk)
+
+
+if task is not None:
+    @task()
+    def update_compressed_story_html_task(story_id, revision_id, content=None, charset=None):
+        update_compressed_story_html(story_id, revision_id, content, charset)
+else:
+    update_compressed_story_html_task = None
+
+
+def enqueue_story_html_compression(story, response=None):
+    """
+    Compress the html of the live revision of a story with a django-tasks worker when it is installed, or else in a
+    background thread: brotli takes too long at its best quality to keep a request waiting. The html is the content
+    of ``response`` when given, or else rendered by the listing page.
+    """
+    args = [story.pk, story.live_revision_id]
+    if response is not None:
+        args += [response.content.decode(response.charset), response.charset]
+
+    enqueue(update_compressed_story_html_task, update_compressed_story_html, *args, pool="story-compression",
+            workers=STORY_COMPRESSION_WORKERS)
+
+
+# sent with the ``story`` and the set of its ``references`` whenever the references of its latest revision, or of its
+# live version if ``live``, are updated
+story_references_updated = Signal()
+
+
+class WebStoryReference(models.Model):
+    """
+    A use of an image, media, document, font or element type by a story, extracted from the config of its latest
+    revision and of its live version, so that the stories using an asset can be found without loading any config
+    """
+    story = models.ForeignKey(WebStory, on_delete=models.CASCADE, related_name="references")
+    live = models.BooleanField(default=False)
+    kind = models.CharField(max_length=20)
+    object_id = models.IntegerField(null=True, blank=True)
+    name = models.CharField(max_length=255, blank=True, default="")
+
+    class Meta:
+        verbose_name = _("Web Story Reference")
+        indexes = [
+            models.Index(fields=["kind", "object_id"], name="webstory_reference_object_idx"),
+            models.Index(fields=["kind", "name"], name="webstory_reference_name_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.story_id}: {self.kind} {self.object_id or self.name}"
+
+    @classmethod
+    def update_for_story(cls, story, live=False):
+        """
+        Bring the references of the latest revision, or of the live version, of a story in line with its config,
+        only writing the references that changed
+        """
+        references = get_story_references(story.config)
+
+        existing = {}
+        for pk, kind, object_id, name in cls.objects.filter(story=story, live=live).values_list(
+                "pk", "kind", "object_id", "name"):
+            existing.setdefault((kind, object_id, name), []).append(pk)
+
+        stale_ids = [pk for key, pks in existing.items() for pk in (pks if key not in references else pks[1:])]
+        if stale_ids:
+            cls.objects.filter(pk__in=stale_ids).delete()
+
+        cls.objects.bulk_create([
+            cls(story=story, live=live, kind=kind, object_id=object_id, name=name)
+            for kind, object_id, name in references - existing.keys()
+        ])
+
+        story_references_updated.send(sender=cls, story=story, references=references, live=live)
+
+    @classmethod
+    def delete_for_story(cls, story, live=False):
+        cls.objects.filter(story=story, live=live).delete()
+
+
+class WebStoryMediaVariant(models.Model):
+    """
+    A web-optimized transcode of a video, served to the editor and to readers of published stories instead of the
+    original upload
+    """
+    media = models.ForeignKey(wagtailmedia_settings.MEDIA_MODEL, on_delete=models.CASCADE,
+                              related_name="optimized_variants")
+    format = models.CharField(max_length=10)
+    file = models.FileField(upload_to="webstories_media_variants")
+    width = models.IntegerField(null=True, blank=True)
+    height = models.IntegerField(null=True, blank=True)
+    # name of the media file this variant was transcoded from, variants of a replaced file are stale
+    source_name = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("Web Story Media Variant")
+        constraints = [
+            models.UniqueConstraint(fields=["media", "format"], name="unique_webstory_media_variant"),
+        ]
+
+    def __str__(self):
+        return f"{self.media_id}: {self.format}"
+
+
 class AbstractWebStoryListPage(RoutablePageMixin, Page):
     # we should only have one instance of the listing page
     max_count = 1
 
+    # set to False when stories are listed by a separate WebStoriesSitemap
+    sitemap_include_stories = True
+
     class Meta:
         abstract = True
 
     @property
     def live_stories(self):
-        live_webstories_stories = WebStory.objects.filter(live=True).order_by("-last_published_at")
+        live_webstories_stories = WebStory.objects.summary().filter(live=True).order_by("-last_published_at")
         return live_webstories_stories
 
     def get_sitemap_urls(self, request=None):
         list_page_sitemap_urls = super(AbstractWebStoryListPage, self).get_sitemap_urls(request)
-        list_page_url = self.get_full_url(request=request)
-
-        for story in self.live_stories:
-            sitemap_url = {
-                "lastmod": story.last_published_at
-            }
 
-            if story.slug:
-                sitemap_url.update({
-                    "location": list_page_url + story.slug
-                })
-            else:
-                sitemap_url.update({
-                    "location": list_page_url + str(story.pk)
-                })
+        if not self.sitemap_include_stories:
+            return list_page_sitemap_urls
 
-            list_page_sitemap_urls.append(sitemap_url)
+        return list_page_sitemap_urls + list(self.get_stories_sitemap_urls(request))
 
-        return list_page_sitemap_urls
-
-    @path('<str:story_id>/')
-    def web_story_page(self, request, story_id):
+    def get_stories_sitemap_urls(self, request=None):
         """
-        View function for web story
+        Streams the sitemap urls of live stories, without loading the stories themselves
         """
-        try:
-            story_id = int(story_id)
-            web_story = get_object_or_404(WebStory, live=True, pk=story_id)
-        except ValueError:
-            web_story = get_object_or_404(WebStory, live=True, slug=story_id)
+        list_page_url = self.get_full_url(request=request)
+        stories = WebStory.objects.filter(live=True).order_by("-last_published_at") \
+            .values_list("pk", "slug", "last_published_at")
+
+        return get_story_sitemap_urls(list_page_url, stories.iterator(chunk_size=2000))
 
+    def render_web_story(self, request, web_story):
         return self.render(
             request,
             context_overrides={
@@ -273,3 +766,39 @@ class AbstractWebStoryListPage(RoutablePageMixin, Page):
             },
             template="wagtail_webstories_editor/story_detail.html"
         )
+
+    @path('<str:story_id>/')
+    def web_story_page(self, request, story_id):
+        """
+        View function for web story
+        """
+        use_cache = not getattr(request, "is_preview", False)
+
+        if use_cache:
+            cached_entry = get_cached_story_response(self, story_id)
+            if cached_entry:
+                return story_response_from_cache_entry(request, cached_entry)
+
+        # read before loading the story, which may be published meanwhile
+        generation = get_story_response_generation() if use_cache else None
+
+        web_stories = WebStory.objects.for_render().select_related("compressed_html")
+
+        try:
+            web_story = get_object_or_404(web_stories, live=True, pk=int(story_id))
+        except ValueError:
+            web_story = get_object_or_404(web_stories, live=True, slug=story_id)
+
+        response = self.render_web_story(request, web_story)
+
+        if not use_cache:
+            return response
+
+        response.render()
+        cached_entry = cache_story_response(self, story_id, web_story, response, generation)
+
+        # the stored variants were not compressed from this html: compress it, to serve it once it is cached again
+        if not cached_entry["encodings"] and claim_story_compression(web_story.pk, web_story.live_revision_id):
+            enqueue_story_html_compression(web_story, response)
+
+        return story_response_from_cache_entry(request, cached_entry)
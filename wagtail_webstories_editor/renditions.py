@@ -0,0 +1,184 @@
+import logging
+from urllib.parse import unquote, urlsplit
+
+from django.conf import settings
+from django.db import transaction
+from wagtail.images import get_image_model
+from wagtail.images.models import Filter, SourceImageIOError
+
+from wagtail_webstories_editor.background import enqueue, task
+from wagtail_webstories_editor.cache import invalidate_story_response_cache
+from wagtail_webstories_editor.html_processor import StoryHTMLProcessor
+from wagtail_webstories_editor.models import WebStory, WebStoryCompressedHTML
+from wagtail_webstories_editor.utils import (
+    REFERENCE_IMAGE,
+    REFERENCE_MEDIA,
+    OptimizedVideosTransformer,
+    ResponsiveImagesTransformer
+)
+from wagtail_webstories_editor.video_optimization import get_optimized_video_sources
+
+logger = logging.getLogger(__name__)
+
+# widths and formats of the renditions served to readers of published stories, in order of preference
+DEFAULT_RESPONSIVE_IMAGE_WIDTHS = [360, 720, 1080]
+DEFAULT_RESPONSIVE_IMAGE_FORMATS = ["webp"]
+
+# renditions shown by the media library of the editor. The first one is the thumbnail,
+# and all of them make the srcset
+DEFAULT_EDITOR_THUMBNAIL_FILTERS = ["max-300x300", "max-600x600"]
+
+# threads generating renditions in each process, when django-tasks is not installed
+RENDITION_WORKERS = 2
+
+
+def get_editor_thumbnail_filters():
+    """
+    Get the rendition filters of the editor thumbnails, from the ``WAGTAIL_WEBSTORIES_EDITOR_THUMBNAIL_FILTERS``
+    setting
+    """
+    specs = getattr(settings, "WAGTAIL_WEBSTORIES_EDITOR_THUMBNAIL_FILTERS", DEFAULT_EDITOR_THUMBNAIL_FILTERS)
+    return [Filter(spec=spec) for spec in specs]
+
+
+def get_existing_editor_renditions(image):
+    """
+    Returns the editor thumbnail renditions of ``image`` that have already been generated, in the order of the
+    filters. Missing renditions are never generated here.
+    """
+    filters = get_editor_thumbnail_filters()
+    renditions = image.find_existing_renditions(*filters)
+    return [renditions[f] for f in filters if f in renditions]
+
+
+def generate_editor_renditions(image_id):
+    image = get_image_model().objects.filter(pk=image_id).first()
+
+    if image is None:
+        return
+
+    try:
+        image.get_renditions(*get_editor_thumbnail_filters())
+    except SourceImageIOError:
+        logger.warning("Could not generate the editor thumbnails of image %s, its file is missing", image_id)
+
+
+if task is not None:
+    @task()
+    def generate_editor_renditions_task(image_id):
+        generate_editor_renditions(image_id)
+else:
+    generate_editor_renditions_task = None
+
+
+def get_responsive_image_settings():
+    """
+    Get the widths and formats of the renditions of published story images, from the
+    ``WAGTAIL_WEBSTORIES_EDITOR_RESPONSIVE_IMAGE_WIDTHS`` and ``WAGTAIL_WEBSTORIES_EDITOR_RESPONSIVE_IMAGE_FORMATS``
+    settings
+    """
+    widths = getattr(settings, "WAGTAIL_WEBSTORIES_EDITOR_RESPONSIVE_IMAGE_WIDTHS", DEFAULT_RESPONSIVE_IMAGE_WIDTHS)
+    formats = getattr(settings, "WAGTAIL_WEBSTORIES_EDITOR_RESPONSIVE_IMAGE_FORMATS", DEFAULT_RESPONSIVE_IMAGE_FORMATS)
+
+    # AMP only has a single fallback image
+    return widths, formats[:2]
+
+
+def get_image_srcsets(image, widths, formats):
+    """
+    The srcsets of an image, one per format, generating the missing renditions. Widths the original does not
+    reach are replaced by its own width.
+    """
+    image_widths = sorted({min(width, image.width) for width in widths})
+    specs = {
+        (image_format, width): f"width-{width}|format-{image_format}"
+        for image_format in formats for width in image_widths
+    }
+
+    renditions = image.get_renditions(*specs.values())
+
+    return [
+        ", ".join(
+            f"{renditions[specs[image_format, width]].url} {renditions[specs[image_format, width]].width}w"
+            for width in image_widths
+        )
+        for image_format in formats
+    ]
+
+
+def get_story_srcsets(story, widths, formats):
+    """
+    The srcsets of the images of the live version of a story, by path of their original file
+    """
+    image_ids = story.references.filter(kind=REFERENCE_IMAGE, live=True).values_list("object_id", flat=True)
+
+    srcsets = {}
+    for image in get_image_model().objects.filter(pk__in=image_ids):
+        try:
+            srcsets[unquote(urlsplit(image.file.url).path)] = get_image_srcsets(image, widths, formats)
+        except SourceImageIOError:
+            logger.warning("Could not generate the renditions of image %s, its file is missing", image.pk)
+
+    return srcsets
+
+
+def rewrite_story_media(story_id):
+    """
+    Add srcsets of renditions to the images of the published html of a story, and the optimized variants of its
+    videos, then refresh its compressed variants and cached responses
+    """
+    story = WebStory.objects.for_render().filter(pk=story_id, live=True).first()
+
+    if story is None or not story.html:
+        return
+
+    transformers = []
+
+    widths, formats = get_responsive_image_settings()
+    if widths and formats:
+        transformers.append(ResponsiveImagesTransformer(get_story_srcsets(story, widths, formats)))
+
+    media_ids = story.references.filter(kind=REFERENCE_MEDIA, live=True).values_list("object_id", flat=True)
+    video_sources = get_optimized_video_sources(media_ids)
+    if video_sources:
+        transformers.append(OptimizedVideosTransformer(video_sources))
+
+    html = StoryHTMLProcessor(transformers).process(story.html)
+
+    if html == story.html:
+        return
+
+    with transaction.atomic():
+        # unless another revision was published meanwhile
+        if not WebStory.objects.filter(pk=story.pk, live_revision_id=story.live_revision_id).update(html=html):
+            return
+
+        story.html = html
+        WebStoryCompressedHTML.update_for_story(story)
+
+    invalidate_story_response_cache(story.pk)
+
+
+if task is not None:
+    @task()
+    def rewrite_story_media_task(story_id):
+        rewrite_story_media(story_id)
+else:
+    rewrite_story_media_task = None
+
+
+def enqueue_story_media_rewrite(story_id):
+    """
+    Rewrite the images and videos of a published story with a django-tasks worker when it is installed,
+    or else in a pool of background threads: generating the renditions takes too long to keep a request waiting
+    """
+    enqueue(rewrite_story_media_task, rewrite_story_media, story_id, pool="renditions", workers=RENDITION_WORKERS)
+
+
+def enqueue_editor_renditions(image_id):
+    """
+    Generate the editor thumbnails of an image with a django-tasks worker when it is installed,
+    or else in a pool of background threads
+    """
+    enqueue(generate_editor_renditions_task, generate_editor_renditions, image_id, pool="renditions",
+            workers=RENDITION_WORKERS)
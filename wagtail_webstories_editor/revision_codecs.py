@@ -0,0 +1,104 @@
+import base64
+import json
+import zlib
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# fields of the revision content that are stored compressed
+COMPRESSED_CONTENT_FIELDS = ["config", "html"]
+
+COMPRESSED_CONTENT_KEY = "compressed_content"
+
+
+class ZlibCodec:
+    name = "zlib"
+
+    def compress(self, data):
+        return zlib.compress(data, 6)
+
+    def decompress(self, data):
+        return zlib.decompress(data)
+
+
+class ZstdCodec:
+    name = "zstd"
+
+    def compress(self, data):
+        return zstandard.ZstdCompressor(level=10).compress(data)
+
+    def decompress(self, data):
+        return zstandard.ZstdDecompressor().decompress(data)
+
+
+REVISION_CODECS = {
+    ZlibCodec.name: ZlibCodec,
+    ZstdCodec.name: ZstdCodec,
+}
+
+
+def get_revision_codec(name):
+    if name not in REVISION_CODECS:
+        raise ImproperlyConfigured("Unknown web story revision codec '%s'" % name)
+
+    if name == ZstdCodec.name and zstandard is None:
+        raise ImproperlyConfigured("The 'zstd' web story revision codec requires the zstandard package")
+
+    return REVISION_CODECS[name]()
+
+
+def get_default_revision_codec():
+    """
+    Get the codec used to store new revisions, from the ``WAGTAIL_WEBSTORIES_EDITOR_REVISION_CODEC`` setting.
+    Defaults to None, storing revisions uncompressed.
+    """
+    name = getattr(settings, "WAGTAIL_WEBSTORIES_EDITOR_REVISION_CODEC", None)
+
+    if not name:
+        return None
+
+    return get_revision_codec(name)
+
+
+def encode_revision_content(content, codec=None):
+    """
+    Replace the heavy fields of a serialized story with a single compressed blob
+    """
+    codec = codec or get_default_revision_codec()
+
+    if codec is None:
+        return content
+
+    heavy_fields = {field: content.get(field) for field in COMPRESSED_CONTENT_FIELDS}
+    data = codec.compress(json.dumps(heavy_fields).encode("utf-8"))
+
+    encoded_content = {key: value for key, value in content.items() if key not in COMPRESSED_CONTENT_FIELDS}
+    encoded_content[COMPRESSED_CONTENT_KEY] = {
+        "codec": codec.name,
+        "data": base64.b64encode(data).decode("ascii"),
+    }
+
+    return encoded_content
+
+
+def decode_revision_content(content):
+    """
+    Returns the serialized story, with its heavy fields decompressed if needed.
+    Revisions are decoded whatever the current codec setting is.
+    """
+    if COMPRESSED_CONTENT_KEY not in content:
+        return content
+
+    compressed_content = content[COMPRESSED_CONTENT_KEY]
+    codec = get_revision_codec(compressed_content["codec"])
+    data = codec.decompress(base64.b64decode(compressed_content["data"]))
+
+    decoded_content = {key: value for key, value in content.items() if key != COMPRESSED_CONTENT_KEY}
+    decoded_content.update(json.loads(data))
+
+    return decoded_content
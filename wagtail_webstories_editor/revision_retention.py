@@ -0,0 +1,113 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from wagtail.models import ModelLogEntry, Revision, TaskState
+
+DEFAULT_REVISION_RETENTION = {
+    # always keep the most recent revisions of a story
+    "keep_last": 20,
+    # older revisions are thinned to one per hour for this many days...
+    "keep_hourly_days": 7,
+    # ...then to one per day for this many days. None keeps daily revisions forever
+    "keep_daily_days": None,
+}
+
+
+def get_revision_retention_policy(**overrides):
+    """
+    Get the revision retention policy from the ``WAGTAIL_WEBSTORIES_EDITOR_REVISION_RETENTION`` setting,
+    completed with the defaults. Overrides that are None are ignored.
+    """
+    policy = dict(DEFAULT_REVISION_RETENTION)
+    policy.update(getattr(settings, "WAGTAIL_WEBSTORIES_EDITOR_REVISION_RETENTION", {}))
+    policy.update({key: value for key, value in overrides.items() if value is not None})
+    return policy
+
+
+# editor autosaves are coalesced over this many seconds by default
+DEFAULT_AUTOSAVE_COALESCE_WINDOW = 5 * 60
+
+
+def get_revision_coalesce_window(autosave=False):
+    """
+    Number of seconds during which saves of a user update their latest draft revision in place, from the
+    ``WAGTAIL_WEBSTORIES_EDITOR_REVISION_COALESCE_WINDOW`` setting. Defaults to 0, creating a revision on every save.
+    Autosaves of the editor are coalesced over the longer of this window and the
+    ``WAGTAIL_WEBSTORIES_EDITOR_AUTOSAVE_COALESCE_WINDOW`` setting, 5 minutes by default.
+    """
+    window = getattr(settings, "WAGTAIL_WEBSTORIES_EDITOR_REVISION_COALESCE_WINDOW", 0)
+
+    if autosave:
+        autosave_window = getattr(settings, "WAGTAIL_WEBSTORIES_EDITOR_AUTOSAVE_COALESCE_WINDOW",
+                                  DEFAULT_AUTOSAVE_COALESCE_WINDOW)
+        return max(window, autosave_window)
+
+    return window
+
+
+def get_protected_revision_ids(stories):
+    """
+    Revisions that must never be pruned: the latest and live revisions, revisions that have been
+    published or are scheduled for publishing, and revisions referenced by workflow tasks
+    """
+    content_type = ContentType.objects.get_for_model(stories[0].__class__)
+    object_ids = [str(story.pk) for story in stories]
+
+    protected_ids = set()
+
+    for story in stories:
+        protected_ids.update([story.latest_revision_id, story.live_revision_id])
+
+    protected_ids.update(
+        ModelLogEntry.objects.filter(content_type=content_type, object_id__in=object_ids, action="wagtail.publish",
+                                     revision__isnull=False)
+        .values_list("revision_id", flat=True)
+    )
+
+    revisions = Revision.objects.filter(base_content_type=content_type, object_id__in=object_ids)
+
+    protected_ids.update(revisions.filter(approved_go_live_at__isnull=False).values_list("pk", flat=True))
+    protected_ids.update(
+        TaskState.objects.filter(revision__in=revisions).values_list("revision_id", flat=True)
+    )
+
+    protected_ids.discard(None)
+
+    return protected_ids
+
+
+def get_revisions_to_prune(revisions, protected_ids, policy, now):
+    """
+    Given the ``(pk, created_at)`` of the revisions of one story, returns the pks of the revisions
+    that the retention policy does not keep
+    """
+    revisions = sorted(revisions, key=lambda revision: revision[1], reverse=True)
+
+    hourly_limit = now - timedelta(days=policy["keep_hourly_days"])
+    daily_limit = now - timedelta(days=policy["keep_daily_days"]) if policy["keep_daily_days"] is not None else None
+
+    kept_hours = set()
+    kept_days = set()
+    to_prune = []
+
+    for index, (pk, created_at) in enumerate(revisions):
+        hour = created_at.replace(minute=0, second=0, microsecond=0)
+        day = created_at.date()
+
+        if index < policy["keep_last"] or pk in protected_ids:
+            keep = True
+        elif created_at >= hourly_limit:
+            keep = hour not in kept_hours
+        elif daily_limit is None or created_at >= daily_limit:
+            keep = day not in kept_days
+        else:
+            keep = False
+
+        if keep:
+            kept_hours.add(hour)
+            kept_days.add(day)
+        else:
+            to_prune.append(pk)
+
+    return to_prune
@@ -0,0 +1,166 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from wagtail.images import get_image_model
+from wagtail.models import Site
+from wagtail.search import index
+from wagtail.signals import page_published, page_unpublished, post_page_move, published, unpublished
+
+from wagtail_webstories_editor.cache import (
+    invalidate_story_response_cache,
+    invalidate_listing_page_url_cache,
+    invalidate_setting_cache,
+    invalidate_sitemap_cache,
+    invalidate_story_counts_cache
+)
+from wagtail_webstories_editor.models import (
+    WebStory,
+    WebStoryCompressedHTML,
+    WebStoryMediaVariant,
+    WebStoriesSetting,
+    WebStoriesPublisherLogo,
+    WebStoryReference,
+    enqueue_story_html_compression,
+    story_references_updated
+)
+from wagtail_webstories_editor.renditions import enqueue_editor_renditions, enqueue_story_media_rewrite
+from wagtail_webstories_editor.utils import REFERENCE_MEDIA
+from wagtail_webstories_editor.video_optimization import enqueue_video_optimization, video_optimized
+
+
+def compress_story_html_on_publish(sender, instance, **kwargs):
+    # off the request, as brotli is slow at its best quality
+    transaction.on_commit(lambda: enqueue_story_html_compression(instance))
+
+
+def delete_compressed_story_html_on_unpublish(sender, instance, **kwargs):
+    WebStoryCompressedHTML.objects.filter(story=instance).delete()
+
+
+def update_live_references_on_publish(sender, instance, **kwargs):
+    WebStoryReference.update_for_story(instance, live=True)
+
+
+def rewrite_story_media_on_publish(sender, instance, **kwargs):
+    # renditions are generated off the request, keeping publishing fast
+    transaction.on_commit(lambda: enqueue_story_media_rewrite(instance.pk))
+
+
+def rewrite_stories_on_video_optimized(sender, media_id, **kwargs):
+    # live stories published before the variants of their videos were ready
+    story_ids = WebStoryReference.objects.filter(kind=REFERENCE_MEDIA, object_id=media_id, live=True).values_list(
+        "story_id", flat=True)
+
+    for story_id in set(story_ids):
+        enqueue_story_media_rewrite(story_id)
+
+
+def update_search_index_on_save(sender, instance, update_fields=None, **kwargs):
+    # saving the draft summary on each edit updates no indexed field, and must not load and index the whole story
+    if update_fields is None:
+        index.insert_or_update_object(instance)
+        return
+
+    if not set(update_fields) & {field.field_name for field in WebStory.search_fields}:
+        return
+
+    # the instance may hold unsaved changes to the fields that were not updated
+    index.insert_or_update_object(WebStory.objects.defer("config", "html", "draft_search_text").get(pk=instance.pk))
+
+
+def remove_from_search_index_on_delete(sender, instance, **kwargs):
+    index.remove_object(instance)
+
+
+def optimize_videos_on_references_update(sender, story, references, live, **kwargs):
+    # the editor inserts the optimized variants of videos, so they are made as soon as a draft uses a video
+    media_ids = [object_id for kind, object_id, name in references if kind == REFERENCE_MEDIA]
+
+    if live or not media_ids or not WebStoriesSetting.objects.filter(media_optimization=True).exists():
+        return
+
+    transaction.on_commit(lambda: enqueue_video_optimization(media_ids))
+
+
+def delete_media_variant_file(sender, instance, **kwargs):
+    transaction.on_commit(lambda: instance.file.delete(save=False))
+
+
+def delete_live_references_on_unpublish(sender, instance, **kwargs):
+    WebStoryReference.delete_for_story(instance, live=True)
+
+
+def invalidate_story_cache_on_publish_change(sender, instance, **kwargs):
+    invalidate_story_response_cache(instance.pk)
+    invalidate_sitemap_cache()
+
+
+def invalidate_story_counts_on_status_change(sender, instance, **kwargs):
+    invalidate_story_counts_cache()
+
+
+def invalidate_story_counts_on_create(sender, instance, created, **kwargs):
+    if created:
+        invalidate_story_counts_cache()
+
+
+def invalidate_listing_page_url_on_change(**kwargs):
+    # the url of the listing page depends on its ancestors and on the sites, so drop it on any change
+    invalidate_listing_page_url_cache()
+
+
+def invalidate_setting_cache_on_setting_change(sender, instance, **kwargs):
+    invalidate_setting_cache([instance.site_id])
+
+
+def invalidate_setting_cache_on_logo_change(sender, instance, **kwargs):
+    site_ids = WebStoriesSetting.objects.filter(pk=instance.setting_id).values_list("site_id", flat=True)
+    invalidate_setting_cache(site_ids)
+
+
+def invalidate_setting_cache_on_image_change(sender, instance, **kwargs):
+    # the urls of publisher logos are cached with the setting
+    site_ids = WebStoriesPublisherLogo.objects.filter(logo=instance).values_list("setting__site_id", flat=True)
+    invalidate_setting_cache(site_ids)
+
+
+def generate_editor_renditions_on_image_save(sender, instance, **kwargs):
+    # generated off the request, so the editor never waits for them
+    transaction.on_commit(lambda: enqueue_editor_renditions(instance.pk))
+
+
+def register_signal_handlers():
+    post_save.connect(update_search_index_on_save, sender=WebStory)
+    post_delete.connect(remove_from_search_index_on_delete, sender=WebStory)
+
+    published.connect(compress_story_html_on_publish, sender=WebStory)
+    unpublished.connect(delete_compressed_story_html_on_unpublish, sender=WebStory)
+
+    published.connect(update_live_references_on_publish, sender=WebStory)
+    published.connect(rewrite_story_media_on_publish, sender=WebStory)
+    unpublished.connect(delete_live_references_on_unpublish, sender=WebStory)
+
+    published.connect(invalidate_story_cache_on_publish_change, sender=WebStory)
+    unpublished.connect(invalidate_story_cache_on_publish_change, sender=WebStory)
+    post_delete.connect(invalidate_story_cache_on_publish_change, sender=WebStory)
+
+    published.connect(invalidate_story_counts_on_status_change, sender=WebStory)
+    unpublished.connect(invalidate_story_counts_on_status_change, sender=WebStory)
+    post_delete.connect(invalidate_story_counts_on_status_change, sender=WebStory)
+    post_save.connect(invalidate_story_counts_on_create, sender=WebStory)
+
+    page_published.connect(invalidate_listing_page_url_on_change)
+    page_unpublished.connect(invalidate_listing_page_url_on_change)
+    post_page_move.connect(invalidate_listing_page_url_on_change)
+    post_save.connect(invalidate_listing_page_url_on_change, sender=Site)
+    post_delete.connect(invalidate_listing_page_url_on_change, sender=Site)
+
+    post_save.connect(invalidate_setting_cache_on_setting_change, sender=WebStoriesSetting)
+    post_delete.connect(invalidate_setting_cache_on_setting_change, sender=WebStoriesSetting)
+    post_save.connect(invalidate_setting_cache_on_logo_change, sender=WebStoriesPublisherLogo)
+    post_delete.connect(invalidate_setting_cache_on_logo_change, sender=WebStoriesPublisherLogo)
+    post_save.connect(invalidate_setting_cache_on_image_change, sender=get_image_model())
+    post_save.connect(generate_editor_renditions_on_image_save, sender=get_image_model())
+
+    story_references_updated.connect(optimize_videos_on_references_update, sender=WebStoryReference)
+    video_optimized.connect(rewrite_stories_on_video_optimized, sender=WebStoryMediaVariant)
+    post_delete.connect(delete_media_variant_file, sender=WebStoryMediaVariant)
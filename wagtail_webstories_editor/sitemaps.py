@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.db.models import Max
+from wagtail.contrib.sitemaps import Sitemap
+
+from wagtail_webstories_editor.cache import (
+    get_listing_page_url,
+    get_webstories_cache,
+    get_webstories_cache_timeout,
+    get_sitemap_version,
+)
+from wagtail_webstories_editor.models import WebStory
+
+SITEMAP_CACHE_PREFIX = "wagtail_webstories_editor:sitemap"
+
+
+class WebStoriesSitemap(Sitemap):
+    """
+    Sitemap of live web stories, split in sections of ``WAGTAIL_WEBSTORIES_EDITOR_SITEMAP_LIMIT`` urls.
+    Use it with a sitemap index, and set ``sitemap_include_stories`` to ``False`` on the listing page
+    so that stories are not listed twice.
+    """
+
+    @property
+    def limit(self):
+        return getattr(settings, "WAGTAIL_WEBSTORIES_EDITOR_SITEMAP_LIMIT", 10000)
+
+    def items(self):
+        # ordered by pk so that stories stay in the same section when others are published
+        return WebStory.objects.filter(live=True).order_by("pk").values_list("pk", "slug", "last_published_at")
+
+    def location(self, item):
+        pk, slug, last_published_at = item
+        return self.list_page_url + (slug or str(pk))
+
+    def lastmod(self, item):
+        return item[2]
+
+    def get_latest_lastmod(self):
+        return WebStory.objects.filter(live=True).aggregate(latest=Max("last_published_at"))["latest"]
+
+    def get_urls(self, page=1, site=None, protocol=None):
+        # story urls are absolute urls under the listing page, rather than paths on the domain of the sitemap
+        self.list_page_url = get_listing_page_url(self.request)
+        if not self.list_page_url:
+            return []
+
+        cache = get_webstories_cache()
+        cache_key = f"{SITEMAP_CACHE_PREFIX}:{get_sitemap_version()}:{self.list_page_url}:{page}"
+
+        urls = cache.get(cache_key)
+
+        if urls is None:
+            urls = [
+                {"location": self.location(item), "lastmod": self.lastmod(item)}
+                for item in self.paginator.page(page).object_list.iterator()
+            ]
+            cache.set(cache_key, urls, get_webstories_cache_timeout())
+
+        last_mods = [url["lastmod"] for url in urls]
+        if last_mods and None not in last_mods:
+            self.latest_lastmod = max(last_mods)
+
+        return urls
@@ -1,29 +1,286 @@
-const getImages = (apiImagesUrl) => fetch(apiImagesUrl).then(res => res.json()).then(res => {
+// WAGTAILAPI_LIMIT_MAX defaults to 20
+const MEDIA_PAGE_SIZE = 20
+
+// id of the last item of each fetched page, to request the next page with keyset pagination
+const mediaCursors = {}
+
+const fetchMediaPage = async (apiUrl, params, pagingNum = 1) => {
+    const query = new URLSearchParams({order: "-id", limit: MEDIA_PAGE_SIZE})
+    Object.entries(params).forEach(([key, value]) => {
+        if (value) {
+            query.set(key, value)
+        }
+    })
+
+    const cursorKey = `${apiUrl}?${query}`
+    const cursors = mediaCursors[cursorKey] = mediaCursors[cursorKey] || {}
+
+    if (pagingNum > 1) {
+        if (cursors[pagingNum]) {
+            query.set("after", cursors[pagingNum])
+        } else {
+            query.set("offset", (pagingNum - 1) * MEDIA_PAGE_SIZE)
+        }
+    }
+
+    const res = await fetch(`${apiUrl}?${query}`).then(res => res.json())
+
+    if (res.items.length) {
+        cursors[pagingNum + 1] = res.items[res.items.length - 1].id
+    }
+
+    // with keyset pagination, the count only covers the items after the cursor
+    const previousItems = query.has("after") ? (pagingNum - 1) * MEDIA_PAGE_SIZE : 0
+    const totalItems = previousItems + res.meta.total_count
+
+    return {
+        items: res.items,
+        meta: {totalItems, totalPages: Math.ceil(totalItems / MEDIA_PAGE_SIZE)}
+    }
+}
+
+// the editor picks the smallest of the resource sizes that fits, so the media panel loads the thumbnail
+// rendition instead of the original image, when it has been generated
+const getImageSizes = (image) => {
+    const {thumbnail} = image.meta
+    if (!thumbnail) {
+        return {}
+    }
+
+    const full = {
+        file: image.title,
+        sourceUrl: image.meta.download_url,
+        mimeType: image.meta.mime_type,
+        width: image.meta.size.width,
+        height: image.meta.size.height,
+    }
+
+    return {
+        thumbnail: {...full, sourceUrl: thumbnail.url, width: thumbnail.width, height: thumbnail.height},
+        full,
+    }
+}
+
+const getImages = (apiImagesUrl, {searchTerm, pagingNum} = {}) => fetchMediaPage(
+    apiImagesUrl, {search: searchTerm}, pagingNum
+).then(res => {
     return {
         items: res.items.map(image => ({
             id: image.id,
             src: image.meta.download_url,
             type: "image",
             mimeType: image.meta.mime_type,
-            sizes: {},
+            sizes: getImageSizes(image),
             width: image.meta.size.width,
             height: image.meta.size.height,
         })),
-        meta: {totalItems: res.meta.total_count, totalPages: 1}
+        meta: res.meta
     }
 });
 
-const getVideos = (apiMediaUrl) => fetch(apiMediaUrl + "?type=video").then(res => res.json()).then(res => {
+// videos are inserted with their optimized mp4 variant when there is one, which plays in every browser. Published
+// stories also get the variants preferred to it
+const getOptimizedVideo = (video) => (video.meta.optimized || []).find(variant => variant.mime_type === "video/mp4")
+
+const getVideos = (apiMediaUrl, {searchTerm, pagingNum, type = "video"} = {}) => fetchMediaPage(
+    apiMediaUrl, {type, search: searchTerm}, pagingNum
+).then(res => {
     return {
         items: res.items.map(video => ({
             id: video.id,
-            src: video.meta.download_url,
-            type: "video",
-            mimeType: video.meta.mime_type,
+            src: getOptimizedVideo(video)?.url || video.meta.download_url,
+            type,
+            mimeType: getOptimizedVideo(video)?.mime_type || video.meta.mime_type,
+            isOptimized: Boolean(getOptimizedVideo(video)),
+            poster: video.meta.thumbnail_url || undefined,
             sizes: {},
             width: 100,
             height: 100,
         })),
-        meta: {totalItems: res.meta.total_count, totalPages: 1}
+        meta: res.meta
+    }
+});
+
+// GET a JSON resource, revalidating the last response with its ETag. Admin responses are never stored
+// by the browser cache, so the response and its ETag are kept in the session storage.
+const fetchJsonWithETag = async (url) => {
+    const storageKey = `wagtail_webstories_editor:etag:${url}`
+    let stored = null
+    try {
+        stored = JSON.parse(sessionStorage.getItem(storageKey))
+    } catch (e) {
+        stored = null
+    }
+
+    const headers = stored ? {"If-None-Match": stored.etag} : {}
+    const res = await fetch(url, {headers, cache: "no-store"})
+
+    if (res.status === 304 && stored) {
+        return stored.data
+    }
+
+    const data = await res.json()
+    const etag = res.headers.get("ETag")
+    if (etag) {
+        try {
+            sessionStorage.setItem(storageKey, JSON.stringify({etag, data}))
+        } catch (e) {
+            // storage full or unavailable, the next request is not conditional
+        }
+    }
+    return data
+}
+
+const escapeJsonPointer = (key) => String(key).replace(/~/g, "~0").replace(/\//g, "~1")
+
+const isObject = (value) => value !== null && typeof value === "object" && !Array.isArray(value)
+
+// JSON patch (RFC 6902) turning source into target
+const createJsonPatch = (source, target, path = "", patch = []) => {
+    if (Array.isArray(source) && Array.isArray(target)) {
+        const commonLength = Math.min(source.length, target.length)
+        for (let i = 0; i < commonLength; i++) {
+            createJsonPatch(source[i], target[i], `${path}/${i}`, patch)
+        }
+        for (let i = commonLength; i < target.length; i++) {
+            patch.push({op: "add", path: `${path}/${i}`, value: target[i]})
+        }
+        for (let i = source.length - 1; i >= commonLength; i--) {
+            patch.push({op: "remove", path: `${path}/${i}`})
+        }
+    } else if (isObject(source) && isObject(target)) {
+        Object.keys(source).forEach(key => {
+            if (!(key in target)) {
+                patch.push({op: "remove", path: `${path}/${escapeJsonPointer(key)}`})
+            }
+        })
+        Object.keys(target).forEach(key => {
+            const keyPath = `${path}/${escapeJsonPointer(key)}`
+            if (key in source) {
+                createJsonPatch(source[key], target[key], keyPath, patch)
+            } else if (target[key] !== undefined) {
+                patch.push({op: "add", path: keyPath, value: target[key]})
+            }
+        })
+    } else if (JSON.stringify(source) !== JSON.stringify(target)) {
+        patch.push({op: "replace", path, value: target})
+    }
+    return patch
+}
+
+// replacement of the range of source that differs from target, in UTF-16 code units
+const createTextSplice = (source, target) => {
+    let start = 0
+    const maxLength = Math.min(source.length, target.length)
+    while (start < maxLength && source[start] === target[start]) {
+        start++
+    }
+    let end = 0
+    while (end < maxLength - start && source[source.length - 1 - end] === target[target.length - 1 - end]) {
+        end++
+    }
+    return {
+        start,
+        end: source.length - end,
+        length: source.length,
+        text: target.substring(start, target.length - end),
+    }
+}
+
+// bodies smaller than this are not worth compressing
+const MIN_COMPRESSED_BODY_SIZE = 1024
+
+const gzipText = (text) => new Response(
+    new Blob([text]).stream().pipeThrough(new CompressionStream("gzip"))
+).arrayBuffer()
+
+// POST a JSON payload, gzipped when the browser supports it
+const postJson = async (url, payload, csrfToken) => {
+    let body = JSON.stringify(payload)
+    const headers = {
+        "X-CSRFToken": csrfToken,
+        "Content-Type": "application/json;charset=UTF-8"
+    }
+
+    if (window.CompressionStream && body.length >= MIN_COMPRESSED_BODY_SIZE) {
+        body = await gzipText(body)
+        headers["Content-Encoding"] = "gzip"
+    }
+
+    return fetch(url, {method: "POST", body, headers, mode: "same-origin"})
+}
+
+// Saves the story incrementally, sending only what changed since the last save.
+// Saves are sent one at a time, and only the latest pending one is kept.
+// Each save is made against the version of the latest revision it was diffed from, which changes on every save.
+const createStoryPatchSaver = ({url, version, config, csrfToken}) => {
+    let savedVersion = version
+    let savedConfig = JSON.parse(JSON.stringify(config))
+    let savedHtml = null
+    let pending = null
+    let saving = false
+    let disabled = !savedVersion
+
+    const post = async (payload) => {
+        const res = await postJson(url, payload, csrfToken)
+        return {status: res.status, data: await res.json()}
+    }
+
+    const send = async ({config, html}) => {
+        const payload = {
+            base_version: savedVersion,
+            config_patch: createJsonPatch(savedConfig, config),
+        }
+        if (savedHtml === null) {
+            payload.html = html
+        } else if (html !== savedHtml) {
+            payload.html_splice = createTextSplice(savedHtml, html)
+        }
+
+        let res = await post(payload)
+
+        if ((res.status === 409 && res.data.error === "html_missing") || res.status === 400) {
+            // the server can not apply the diff, send the whole story
+            delete payload.html_splice
+            payload.config_patch = [{op: "replace", path: "", value: config}]
+            payload.html = html
+            res = await post(payload)
+        }
+
+        if (res.status !== 200) {
+            // another save happened meanwhile, leave it to the edit form
+            disabled = true
+            console.warn("Incremental story save failed", res.data)
+            return
+        }
+
+        savedVersion = res.data.version
+        savedConfig = config
+        savedHtml = html
+    }
+
+    const flush = async () => {
+        saving = true
+        while (pending && !disabled) {
+            const story = pending
+            pending = null
+            try {
+                await send(story)
+            } catch (e) {
+                disabled = true
+                console.warn("Incremental story save failed", e)
+            }
+        }
+        saving = false
+    }
+
+    return (config, html) => {
+        if (disabled) {
+            return
+        }
+        pending = {config: JSON.parse(JSON.stringify(config)), html}
+        if (!saving) {
+            flush()
+        }
     }
-});
\ No newline at end of file
+}
@@ -1,3 +1,369 @@
+import gzip
+import json
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from wagtail.models import Revision, Site
+
+from wagtail_webstories_editor import get_webstories_listing_page_model
+from wagtail_webstories_editor.cache import (
+    cache_story_response,
+    get_cached_story_response,
+    get_story_response_generation,
+    get_webstories_cache,
+    invalidate_story_response_cache
+)
+from wagtail_webstories_editor.compression import get_content_hash
+from wagtail_webstories_editor.models import WebStory, WebStoryCompressedHTML
+
+STORY_HTML = (
+    '<!DOCTYPE html><html amp=""><head><meta charset="utf-8"></head><body><amp-story standalone="">'
+    '<amp-story-page id="page-1"><p>Hello</p></amp-story-page></amp-story></body></html>'
+)
+
+
+def get_story_config(title):
+    return {
+        "title": {"raw": title},
+        "storyData": {"pages": [{"elements": [{"type": "text", "content": "Hello <b>world</b>"}]}]},
+    }
+
+
+def create_story(title="Story", slug=None, publish=False, user=None):
+    story = WebStory(title=title, slug=slug, config=get_story_config(title), html=STORY_HTML, live=False)
+    story.full_clean()
+    story.save()
+
+    revision = story.save_revision(user=user)
+    if publish:
+        revision.publish()
+
+    return WebStory.objects.get(pk=story.pk)
+
+
+class WebStoriesTestCase(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_superuser("admin", "admin@example.com", "password")
+        self.client.force_login(self.user)
+        get_webstories_cache().clear()
+        self.addCleanup(get_webstories_cache().clear)
+
+
+class WebStoriesListTestCase(WebStoriesTestCase):
+    url = "/admin/web-stories-list/"
+
+    def get_stories(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def assert_list_queries(self, story_count):
+        for i in range(story_count):
+            create_story(f"Story {i}", publish=i % 2 == 0, user=self.user)
+
+        # the first request fills the cached story counts
+        self.get_stories()
+
+        # the session, the user, the stories and the listing page, whatever the number of stories
+        with self.assertNumQueries(4):
+            data = self.get_stories()
+
+        self.assertEqual(len(data["fetchedStoryIds"]), story_count)
+
+    def test_list_queries_5_stories(self):
+        self.assert_list_queries(5)
+
+    def test_list_queries_20_stories(self):
+        self.assert_list_queries(20)
+
+    def walk_with_cursor(self, **params):
+        story_ids = []
+        data = self.get_stories(**params)
+        story_ids += data["fetchedStoryIds"]
+
+        while data["nextCursor"]:
+            data = self.get_stories(after=data["nextCursor"], **params)
+            story_ids += data["fetchedStoryIds"]
+
+        return story_ids
+
+    def walk_with_offset(self, **params):
+        data = self.get_stories(**params)
+        story_ids = list(data["fetchedStoryIds"])
+
+        for page in range(2, data["totalPages"] + 1):
+            story_ids += self.get_stories(page=page, **params)["fetchedStoryIds"]
+
+        return story_ids
+
+    def test_cursor_walk(self):
+        stories = [create_story(f"Story {i % 7}", publish=i % 3 == 0) for i in range(45)]
+
+        # stories with the same date are ordered by id, and come before the others
+        WebStory.objects.filter(pk__in=[story.pk for story in stories[:30]]).update(
+            created_at=timezone.now() - timedelta(days=1), last_published_at=None)
+
+        for params in [{}, {"orderby": "modified"}, {"orderby": "title"}, {"orderby": "date", "order": "asc"},
+                       {"status": "draft"}]:
+            with self.subTest(**params):
+                story_ids = self.walk_with_cursor(**params)
+
+                self.assertEqual(story_ids, self.walk_with_offset(**params))
+                self.assertEqual(len(story_ids), len(set(story_ids)))
+
+        self.assertCountEqual(self.walk_with_cursor(), [story.pk for story in stories])
+        self.assertEqual(
+            self.walk_with_cursor(orderby="date", order="asc")[:30], [story.pk for story in stories[:30]]
+        )
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {"after": "invalid"})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["error"], "invalid_cursor")
+
+
+class PatchWebStoryTestCase(WebStoriesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.story = create_story("Patched", slug="patched", user=self.user)
+
+    def patch(self, data):
+        return self.client.post(
+            reverse("web_stories_patch", args=[self.story.pk]), json.dumps(data), content_type="application/json"
+        )
+
+    def patch_title(self, title, base_version=None):
+        return self.patch({
+            "base_version": base_version or WebStory.objects.get(pk=self.story.pk).draft_version,
+            "config_patch": [{"op": "replace", "path": "/title/raw", "value": title}],
+            "html": STORY_HTML.replace("Hello", title),
+        })
+
+    def test_patch(self):
+        response = self.patch_title("New title")
+
+        self.assertEqual(response.status_code, 200)
+
+        story = WebStory.objects.get(pk=self.story.pk)
+        self.assertEqual(response.json()["revision"], story.latest_revision_id)
+        self.assertEqual(response.json()["version"], story.draft_version)
+        self.assertEqual(story.draft_title, "New title")
+        self.assertTrue(story.has_unpublished_changes)
+
+        draft = story.get_latest_revision_as_object()
+        self.assertEqual(draft.config["title"]["raw"], "New title")
+        self.assertIn("New title", draft.html)
+
+    def test_patch_html_splice(self):
+        version = self.patch_title("Spliced").json()["version"]
+
+        response = self.patch({
+            "base_version": version,
+            "html_splice": {
+                "start": 0,
+                "end": len("<!DOCTYPE html>"),
+                "length": len(STORY_HTML.replace("Hello", "Spliced")),
+                "text": "<!doctype html>",
+            },
+        })
+
+        self.assertEqual(response.status_code, 200)
+        html = WebStory.objects.get(pk=self.story.pk).get_latest_revision_as_object().html
+        self.assertTrue(html.startswith("<!doctype html>"))
+        self.assertIn("Spliced", html)
+
+    def test_patch_conflict(self):
+        base_version = self.story.draft_version
+        self.story.get_latest_revision_as_object().save_revision(user=None)
+
+        response = self.patch_title("Stale", base_version=base_version)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["error"], "conflict")
+        self.assertEqual(response.json()["version"], WebStory.objects.get(pk=self.story.pk).draft_version)
+        self.assertEqual(WebStory.objects.get(pk=self.story.pk).draft_title, "Patched")
+
+    def test_patch_conflict_with_coalesced_save(self):
+        base_version = self.story.draft_version
+
+        response = self.patch_title("First", base_version=base_version)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["revision"], self.story.latest_revision_id)
+
+        # another tab saved in place of the same revision meanwhile
+        response = self.patch_title("Stale", base_version=base_version)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["error"], "conflict")
+        self.assertEqual(WebStory.objects.get(pk=self.story.pk).draft_title, "First")
+
+    def test_patch_invalid(self):
+        for config_patch in [
+            [{"op": "replace", "path": "/missing/key", "value": 1}],
+            [{"op": "replace", "path": 1, "value": 1}],
+            [{"op": "move", "from": None, "path": "/title"}],
+            {"op": "replace", "path": "/title/raw", "value": "Not a list"},
+            ["replace"],
+        ]:
+            with self.subTest(config_patch=config_patch):
+                response = self.patch({
+                    "base_version": self.story.draft_version,
+                    "config_patch": config_patch,
+                    "html": STORY_HTML,
+                })
+
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()["error"], "invalid_patch")
+                self.assertEqual(WebStory.objects.get(pk=self.story.pk).draft_version, self.story.draft_version)
+
+    def test_patch_invalid_json(self):
+        for body in ["{", "[1, 2]", "null"]:
+            with self.subTest(body=body):
+                response = self.client.post(reverse("web_stories_patch", args=[self.story.pk]), body,
+                                            content_type="application/json")
+
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()["error"], "invalid_json")
+
+    def test_autosaves_coalesce(self):
+        revision_id = self.patch_title("First").json()["revision"]
+
+        # the revision was created a minute ago, within the coalescing window
+        created_at = timezone.now() - timedelta(minutes=1)
+        Revision.objects.filter(pk=revision_id).update(created_at=created_at)
+
+        response = self.patch_title("Second")
+
+        self.assertEqual(response.json()["revision"], revision_id)
+
+        story = WebStory.objects.get(pk=self.story.pk)
+        self.assertEqual(story.latest_revision_id, revision_id)
+        self.assertEqual(story.draft_title, "Second")
+        self.assertEqual(story.get_latest_revision_as_object().config["title"]["raw"], "Second")
+        # the story was modified now, the revision keeps its creation date
+        self.assertGreater(story.latest_revision_created_at, created_at)
+        self.assertEqual(Revision.objects.get(pk=revision_id).created_at, created_at)
+
+    def test_autosaves_after_window_do_not_coalesce(self):
+        revision_id = self.patch_title("First").json()["revision"]
+        Revision.objects.filter(pk=revision_id).update(created_at=timezone.now() - timedelta(hours=1))
+
+        response = self.patch_title("Second")
+
+        self.assertNotEqual(response.json()["revision"], revision_id)
+
+    def test_autosaves_after_publish_do_not_coalesce(self):
+        revision_id = self.patch_title("First").json()["revision"]
+        Revision.objects.get(pk=revision_id).publish()
+
+        response = self.patch_title("Second")
+
+        self.assertNotEqual(response.json()["revision"], revision_id)
+        self.assertEqual(Revision.objects.get(pk=revision_id).as_object().title, "First")
+
+
+class StoryResponseCacheTestCase(TestCase):
+    def setUp(self):
+        get_webstories_cache().clear()
+        self.addCleanup(get_webstories_cache().clear)
+
+        self.list_page = get_webstories_listing_page_model()(title="Stories", slug="stories")
+        Site.objects.get(is_default_site=True).root_page.add_child(instance=self.list_page)
+        self.list_page.save_revision().publish()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.story = create_story("Cached", slug="cached", publish=True)
+
+    def get_story(self):
+        response = self.client.get(self.list_page.url + "cached/")
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_publish_refreshes_cached_story(self):
+        self.assertIn("Hello", self.get_story())
+        self.assertIsNotNone(get_cached_story_response(self.list_page, "cached"))
+
+        draft = self.story.get_latest_revision_as_object()
+        draft.html = STORY_HTML.replace("Hello", "Updated")
+        with self.captureOnCommitCallbacks(execute=True):
+            draft.save_revision().publish()
+
+        self.assertIn("Updated", self.get_story())
+
+    def test_story_published_while_caching_is_not_cached(self):
+        generation = get_story_response_generation()
+
+        # the story is published after the request loaded it, and before it is cached
+        invalidate_story_response_cache(self.story.pk)
+        cache_story_response(self.list_page, "cached", self.story, HttpResponse("Stale"), generation)
+
+        self.assertIsNone(get_cached_story_response(self.list_page, "cached"))
+
+        cache_story_response(self.list_page, "cached", self.story, HttpResponse("Current"),
+                             get_story_response_generation())
+
+        self.assertEqual(get_cached_story_response(self.list_page, "cached")["content"], b"Current")
+
+    def get_compressed_story(self):
+        response = self.client.get(self.list_page.url + "cached/", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_compressed_story_matches_response(self):
+        response = self.get_compressed_story()
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content).decode(), self.get_story())
+
+    def test_story_rendered_differently_is_compressed_again(self):
+        # as when the template of the story renders it differently for readers
+        WebStoryCompressedHTML.objects.filter(story=self.story).update(
+            content_hash=get_content_hash(b"Other"), gzip=gzip.compress(b"Other"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.get_compressed_story()
+
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+        response = self.get_compressed_story()
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content).decode(), self.get_story())
+
+
+class WebStorySlugTestCase(TestCase):
+    def test_slug_allocation(self):
+        stories = [create_story("Slugged", slug="slugged") for _ in range(3)]
+
+        self.assertEqual([story.slug for story in stories], ["slugged", "slugged-2", "slugged-3"])
+
+    def test_slug_allocation_fills_gaps(self):
+        create_story("Slugged", slug="slugged")
+        create_story("Slugged", slug="slugged-3")
+
+        self.assertEqual(create_story("Slugged", slug="slugged").slug, "slugged-2")
+
+    def test_slug_taken_before_save(self):
+        story = WebStory(title="Raced", slug="raced", config=get_story_config("Raced"), html=STORY_HTML)
+        story.full_clean()
+
+        # another story takes the slug between full_clean and save
+        create_story("Raced", slug="raced")
+        story.save()
+
+        self.assertEqual(story.slug, "raced-2")
+
+    def test_slug_retry_starts_from_base_slug(self):
+        create_story("Suffixed", slug="suffixed")
+        create_story("Suffixed", slug="suffixed-2")
+
+        # saved without full_clean, as when publishing
+        story = WebStory(title="Suffixed", slug="suffixed-2", config=get_story_config("Suffixed"), html=STORY_HTML)
+        story.save()
 
-# Create your tests here.
+        self.assertEqual(story.slug, "suffixed-3")
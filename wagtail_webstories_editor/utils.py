@@ -1,30 +1,40 @@
 import json
+from html import unescape
+from urllib.parse import unquote, urlsplit
 
-from bs4 import BeautifulSoup
+from django.utils.html import strip_tags
+from wagtail import hooks
 
+from .html_processor import HTMLToken, StoryHTMLProcessor, StoryHTMLTransformer
 
-def add_video_cache(doc, cache_enabled):
-    if not cache_enabled:
-        return doc
 
-    soup = BeautifulSoup(doc, 'html.parser')
-    amp_videos = soup.findAll('amp-video')
+AMP_RUNTIME_SCRIPT_URL = "https://cdn.ampproject.org/v0.js"
 
-    if amp_videos:
-        for amp_video in amp_videos:
-            amp_video.attrs["cache"] = "google"
+AMP_ANALYTICS_SCRIPT = '''
+    <script async="" custom-element="amp-analytics" src="https://cdn.ampproject.org/v0/amp-analytics-0.1.js"></script>
+    '''
 
-    return str(soup)
 
+class VideoCacheTransformer(StoryHTMLTransformer):
+    """
+    Opts all amp-video elements in to the Google video cache
+    """
 
-def add_google_analytics(doc, google_analytics_id):
-    default_config = get_default_google_analytics_config(google_analytics_id)
+    def handle_token(self, token, open_tags):
+        if token.kind == HTMLToken.START_TAG and token.name == "amp-video":
+            token.set_attribute("cache", "google")
 
-    amp_analytics_script = '''
-    <script async="" custom-element="amp-analytics" src="https://cdn.ampproject.org/v0/amp-analytics-0.1.js"></script>
-    '''
 
-    amp_analytics_config = f'''
+class GoogleAnalyticsTransformer(StoryHTMLTransformer):
+    """
+    Adds the amp-analytics script before the AMP runtime script in the head, and the
+    amp-analytics configuration after the first child of the body
+    """
+
+    def __init__(self, google_analytics_id):
+        default_config = get_default_google_analytics_config(google_analytics_id)
+
+        self.amp_analytics_config = f'''
     <amp-analytics type="gtag" data-credentials="include">
       <script type="application/json">
         {json.dumps(default_config)}
@@ -32,16 +42,328 @@ def add_google_analytics(doc, google_analytics_id):
     </amp-analytics>
     '''
 
-    soup = BeautifulSoup(doc, 'html.parser')
+        self.script_added = False
+        self.config_added = False
+        self.body_children_depth = None
+        self.waiting_for_first_child_end = False
+
+    def handle_token(self, token, open_tags):
+        if self.config_added:
+            return
+
+        if not self.script_added:
+            if (token.kind == HTMLToken.START_TAG and token.name == "script" and "head" in open_tags
+                    and token.get_attribute("src") == AMP_RUNTIME_SCRIPT_URL):
+                token.before.append(AMP_ANALYTICS_SCRIPT)
+                self.script_added = True
+            return
+
+        if self.body_children_depth is None:
+            if token.kind == HTMLToken.START_TAG and token.name == "body":
+                self.body_children_depth = len(open_tags) + 1
+            return
+
+        depth = len(open_tags)
+
+        if depth < self.body_children_depth:
+            # body closed without children
+            token.before.append(self.amp_analytics_config)
+            self.config_added = True
+        elif depth == self.body_children_depth:
+            if self.waiting_for_first_child_end or not token.opens_element:
+                token.after.append(self.amp_analytics_config)
+                self.config_added = True
+            else:
+                self.waiting_for_first_child_end = True
+
+
+class ResponsiveImagesTransformer(StoryHTMLTransformer):
+    """
+    Sets a ``srcset`` of renditions on the amp-img elements showing Wagtail images, replacing the one of the editor.
+    ``srcsets`` maps the path of the original file of each image to its srcsets, from the preferred format to the
+    fallback one. The fallback srcset is set on a nested ``fallback`` amp-img, which AMP shows if the preferred format
+    cannot be loaded, and which is updated instead of added again when a story is rewritten.
+    """
+
+    def __init__(self, srcsets):
+        self.srcsets = srcsets
+        self.fallback = None
+
+    def handle_token(self, token, open_tags):
+        fallback, self.fallback = self.fallback, None
+
+        if fallback is not None:
+            if token.kind == HTMLToken.START_TAG and token.name == "amp-img" and "fallback" in token.attrs:
+                token.set_attribute("srcset", fallback.get_attribute("srcset"))
+                return
+
+            token.before.insert(0, fallback.render() + "</amp-img>")
+
+        if token.kind != HTMLToken.START_TAG or token.name != "amp-img":
+            return
+
+        srcsets = self.srcsets.get(unquote(urlsplit(token.get_attribute("src", "")).path))
+        if not srcsets:
+            return
+
+        if len(srcsets) > 1 and not token.is_self_closing:
+            self.fallback = HTMLToken(HTMLToken.START_TAG, token.text, token.name)
+            self.fallback.set_attribute("fallback", "")
+            self.fallback.set_attribute("srcset", srcsets[1])
+
+        token.set_attribute("srcset", srcsets[0])
+
+
+class OptimizedVideosTransformer(StoryHTMLTransformer):
+    """
+    Adds the optimized variants of videos as the first sources of amp-video elements, the browser playing the first
+    one it supports. ``sources`` maps the path of the original file of each video, and of each of its variants, to the
+    ``(url, mime_type)`` of its variants in order of preference. Only variants preferred to the first source of an
+    amp-video are added, so that rewriting a story again leaves it unchanged.
+    """
+
+    def __init__(self, sources):
+        self.sources = sources
+        self.first_source = False
+
+    def handle_token(self, token, open_tags):
+        if token.kind != HTMLToken.START_TAG:
+            return
+
+        if token.name == "amp-video":
+            self.first_source = True
+            return
+
+        if token.name != "source" or not open_tags or open_tags[-1] != "amp-video" or not self.first_source:
+            return
+
+        self.first_source = False
+
+        path = unquote(urlsplit(token.get_attribute("src", "")).path)
+        variants = self.sources.get(path)
+        if not variants:
+            return
+
+        paths = [unquote(urlsplit(url).path) for url, mime_type in variants]
+        if path in paths:
+            variants = variants[:paths.index(path)]
+
+        for url, mime_type in variants:
+            source = HTMLToken(HTMLToken.START_TAG, token.text, token.name)
+            source.set_attribute("type", mime_type)
+            source.set_attribute("src", url)
+            token.before.append(source.render())
+
+
+def get_story_html_transformers(web_stories_setting):
+    """
+    Transformers to apply to the html of a story on save, according to the web stories settings.
+    Use the ``construct_webstory_html_transformers`` hook to add or remove transformers.
+    """
+    transformers = []
+
+    if web_stories_setting.video_cache:
+        transformers.append(VideoCacheTransformer())
+
+    if web_stories_setting.google_analytics_id:
+        transformers.append(GoogleAnalyticsTransformer(web_stories_setting.google_analytics_id))
+
+    for fn in hooks.get_hooks("construct_webstory_html_transformers"):
+        fn(transformers, web_stories_setting)
+
+    return transformers
+
+
+def process_story_html(doc, web_stories_setting):
+    transformers = get_story_html_transformers(web_stories_setting)
+    return StoryHTMLProcessor(transformers).process(doc)
+
+
+def get_story_summary(config):
+    """
+    Extract the summary fields of a story from its editor config: the featured media url,
+    the poster url (the featured media, or else the first image of the story) and the page count
+    """
+    summary = {
+        "featured_media_url": None,
+        "poster_url": None,
+        "page_count": 0,
+    }
+
+    if not isinstance(config, dict):
+        return summary
+
+    featured_media = config.get("featuredMedia")
+    if isinstance(featured_media, dict) and featured_media.get("url"):
+        summary["featured_media_url"] = featured_media.get("url")
+        summary["poster_url"] = featured_media.get("url")
 
-    head_tag = soup.find('head')
-    script_tag = head_tag.find('script', src="https://cdn.ampproject.org/v0.js")
+    story_data = config.get("storyData")
+    pages = story_data.get("pages") if isinstance(story_data, dict) else None
+
+    if not isinstance(pages, list):
+        return summary
+
+    summary["page_count"] = len(pages)
+
+    if not summary["poster_url"]:
+        for page in pages:
+            elements = page.get("elements") if isinstance(page, dict) else None
+            for element in elements or []:
+                if isinstance(element, dict) and element.get("type") == "image":
+                    resource = element.get("resource") or {}
+                    summary["poster_url"] = resource.get("src")
+                    return summary
+
+    return summary
+
+
+def get_story_text(config):
+    """
+    Extract the searchable text of a story from its editor config: the title, the excerpt and the content
+    of all text elements, one per line
+    """
+    if not isinstance(config, dict):
+        return ""
+
+    texts = []
+
+    for key in ["title", "excerpt"]:
+        value = config.get(key)
+        if isinstance(value, dict):
+            value = value.get("raw")
+        if isinstance(value, str):
+            texts.append(value)
+
+    story_data = config.get("storyData")
+    pages = story_data.get("pages") if isinstance(story_data, dict) else None
+
+    for page in pages if isinstance(pages, list) else []:
+        elements = page.get("elements") if isinstance(page, dict) else None
+        for element in elements if isinstance(elements, list) else []:
+            if isinstance(element, dict) and element.get("type") == "text" and isinstance(element.get("content"), str):
+                # text elements hold html, with <br> or block tags between lines
+                content = element["content"].replace("<br", "\n<br").replace("</p>", "</p>\n")
+                texts.append(unescape(strip_tags(content)))
+
+    return "\n".join(text.strip() for text in texts if text and text.strip())
+
+
+# kinds of references of a story, to Wagtail images, media and documents by id, and to fonts and element types by name
+REFERENCE_IMAGE = "image"
+REFERENCE_MEDIA = "media"
+REFERENCE_DOCUMENT = "document"
+REFERENCE_FONT = "font"
+REFERENCE_ELEMENT_TYPE = "element"
+
+# the resource types of the editor, and the Wagtail models they come from
+RESOURCE_REFERENCE_KINDS = {
+    "image": REFERENCE_IMAGE,
+    "video": REFERENCE_MEDIA,
+    "audio": REFERENCE_MEDIA,
+}
+
+
+def get_reference_id(value):
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return None
+
+
+def get_resource_references(resource):
+    references = set()
+
+    if not isinstance(resource, dict):
+        return references
+
+    kind = RESOURCE_REFERENCE_KINDS.get(resource.get("type"))
+    object_id = get_reference_id(resource.get("id"))
+    if kind and object_id is not None:
+        references.add((kind, object_id, ""))
+
+    # videos have an image poster
+    poster_id = get_reference_id(resource.get("posterId"))
+    if poster_id is not None:
+        references.add((REFERENCE_IMAGE, poster_id, ""))
+
+    return references
+
+
+def get_story_references(config):
+    """
+    Extract the references of a story from its editor config, as a set of ``(kind, object_id, name)``: the images,
+    media and caption documents it uses by id, and the fonts and element types it uses by name
+    """
+    references = set()
+
+    if not isinstance(config, dict):
+        return references
+
+    featured_media = config.get("featuredMedia")
+    if isinstance(featured_media, dict):
+        object_id = get_reference_id(featured_media.get("id"))
+        if object_id is not None:
+            references.add((REFERENCE_IMAGE, object_id, ""))
+
+    story_data = config.get("storyData")
+    pages = story_data.get("pages") if isinstance(story_data, dict) else None
+
+    for page in pages if isinstance(pages, list) else []:
+        if not isinstance(page, dict):
+            continue
+
+        background_audio = page.get("backgroundAudio")
+        if isinstance(background_audio, dict):
+            references |= get_resource_references(background_audio.get("resource"))
+
+        elements = page.get("elements")
+        for element in elements if isinstance(elements, list) else []:
+            if not isinstance(element, dict):
+                continue
+
+            if isinstance(element.get("type"), str):
+                references.add((REFERENCE_ELEMENT_TYPE, None, element["type"][:255]))
+
+            references |= get_resource_references(element.get("resource"))
+
+            for track in element.get("tracks") or []:
+                object_id = get_reference_id(track.get("id")) if isinstance(track, dict) else None
+                if object_id is not None:
+                    references.add((REFERENCE_DOCUMENT, object_id, ""))
+
+            font = element.get("font")
+            if isinstance(font, dict) and isinstance(font.get("family"), str):
+                references.add((REFERENCE_FONT, None, font["family"][:255]))
+
+    return references
+
+
+def get_story_sitemap_urls(list_page_url, stories):
+    """
+    Sitemap urls for the given stories, as ``(pk, slug, last_published_at)`` tuples
+    """
+    for pk, slug, last_published_at in stories:
+        yield {
+            "location": list_page_url + (slug or str(pk)),
+            "lastmod": last_published_at,
+        }
+
+
+def add_video_cache(doc, cache_enabled):
+    if not cache_enabled:
+        return doc
+
+    return StoryHTMLProcessor([VideoCacheTransformer()]).process(doc)
+
+
+def add_google_analytics(doc, google_analytics_id):
+    transformer = GoogleAnalyticsTransformer(google_analytics_id)
+    processed_doc = StoryHTMLProcessor([transformer]).process(doc)
 
-    if head_tag and script_tag:
-        # Insert the amp-analytics configuration just before the <script> tag
-        script_tag.insert_before(BeautifulSoup(amp_analytics_script, 'html.parser'))
-        soup.body.insert(1, BeautifulSoup(amp_analytics_config, 'html.parser'))
-        return str(soup)
+    if transformer.script_added and transformer.config_added:
+        return processed_doc
 
     return doc
 
@@ -0,0 +1,278 @@
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from urllib.parse import unquote, urlsplit
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.dispatch import Signal
+from wagtailmedia.models import get_media_model
+
+from wagtail_webstories_editor.background import enqueue, task
+from wagtail_webstories_editor.cache import claim_video_optimization, release_video_optimization
+from wagtail_webstories_editor.models import WebStoryMediaVariant
+
+logger = logging.getLogger(__name__)
+
+# sent with the ``media_id`` of a video once its optimized variants are saved
+video_optimized = Signal()
+
+# encoding of each variant format. Videos are scaled down to the height of a story page, and their mp4 variant
+# starts playing before it is fully downloaded
+VIDEO_FORMATS = {
+    "mp4": {
+        "mime_type": "video/mp4",
+        "args": ["-c:v", "libx264", "-preset", "veryfast", "-crf", "28", "-profile:v", "main", "-pix_fmt", "yuv420p",
+                 "-c:a", "aac", "-b:a", "128k", "-movflags", "+faststart"],
+    },
+    "webm": {
+        "mime_type": "video/webm",
+        "args": ["-c:v", "libvpx-vp9", "-crf", "36", "-b:v", "0", "-deadline", "good", "-cpu-used", "4",
+                 "-row-mt", "1", "-pix_fmt", "yuv420p", "-c:a", "libopus", "-b:a", "96k"],
+    },
+}
+DEFAULT_VIDEO_FORMATS = ["webm", "mp4"]
+
+VIDEO_MAX_HEIGHT = 1280
+SCALE_FILTER = f"scale=-2:'min({VIDEO_MAX_HEIGHT},trunc(ih/2)*2)'"
+
+DEFAULT_VIDEO_OPTIMIZATION_WORKERS = 2
+DEFAULT_VIDEO_OPTIMIZATION_TIMEOUT = 15 * 60
+
+_pool_lock = threading.Lock()
+_ffmpeg_slots = None
+
+
+def get_ffmpeg_path():
+    """
+    Path of the ffmpeg binary named by the ``WAGTAIL_WEBSTORIES_EDITOR_FFMPEG`` setting, or None if it is not
+    installed, which disables the optimization of videos
+    """
+    return shutil.which(getattr(settings, "WAGTAIL_WEBSTORIES_EDITOR_FFMPEG", "ffmpeg"))
+
+
+def get_video_formats():
+    """
+    Get the formats of the optimized variants, in order of preference, from the
+    ``WAGTAIL_WEBSTORIES_EDITOR_VIDEO_FORMATS`` setting
+    """
+    formats = getattr(settings, "WAGTAIL_WEBSTORIES_EDITOR_VIDEO_FORMATS", DEFAULT_VIDEO_FORMATS)
+    return [video_format for video_format in formats if video_format in VIDEO_FORMATS]
+
+
+def get_video_optimization_workers():
+    workers = getattr(settings, "WAGTAIL_WEBSTORIES_EDITOR_VIDEO_OPTIMIZATION_WORKERS",
+                      DEFAULT_VIDEO_OPTIMIZATION_WORKERS)
+    return max(workers, 1)
+
+
+def get_video_optimization_timeout():
+    return getattr(settings, "WAGTAIL_WEBSTORIES_EDITOR_VIDEO_OPTIMIZATION_TIMEOUT", DEFAULT_VIDEO_OPTIMIZATION_TIMEOUT)
+
+
+def get_ffmpeg_slots():
+    global _ffmpeg_slots
+
+    with _pool_lock:
+        if _ffmpeg_slots is None:
+            _ffmpeg_slots = threading.BoundedSemaphore(get_video_optimization_workers())
+
+    return _ffmpeg_slots
+
+
+def run_ffmpeg(args):
+    """
+    Run ffmpeg with ``args``. Each transcode uses several cores, so a process never runs more ffmpeg processes at
+    once than ``WAGTAIL_WEBSTORIES_EDITOR_VIDEO_OPTIMIZATION_WORKERS``, and kills those that run past the timeout.
+    """
+    with get_ffmpeg_slots():
+        subprocess.run(
+            [get_ffmpeg_path(), "-nostdin", "-y", "-v", "error", *args],
+            check=True,
+            capture_output=True,
+            timeout=get_video_optimization_timeout(),
+        )
+
+
+def get_scaled_size(width, height):
+    """
+    Size of the variants of a video of ``width`` x ``height``, as scaled by ``SCALE_FILTER``
+    """
+    if not width or not height:
+        return None, None
+
+    scaled_height = min(VIDEO_MAX_HEIGHT, height // 2 * 2)
+    return round(width * scaled_height / height / 2) * 2, scaled_height
+
+
+def get_optimized_variants(media):
+    """
+    The up to date variants of a video, in order of preference. Reads prefetched ``optimized_variants``.
+    """
+    formats = get_video_formats()
+    variants = [
+        variant for variant in media.optimized_variants.all()
+        if variant.format in formats and variant.source_name == media.file.name
+    ]
+    return sorted(variants, key=lambda variant: formats.index(variant.format))
+
+
+def get_videos_to_optimize(media_ids=None):
+    """
+    Videos missing an up to date variant in one of the formats
+    """
+    formats = get_video_formats()
+    videos = get_media_model().objects.filter(type="video")
+
+    if media_ids is not None:
+        videos = videos.filter(pk__in=media_ids)
+
+    return videos.annotate(
+        up_to_date_variants=Count("optimized_variants", filter=Q(
+            optimized_variants__format__in=formats,
+            optimized_variants__source_name=F("file"),
+        ))
+    ).filter(up_to_date_variants__lt=len(formats))
+
+
+def get_optimized_video_sources(media_ids):
+    """
+    The sources served instead of the original files of videos, for ``OptimizedVideosTransformer``
+    """
+    sources = {}
+
+    for media in get_media_model().objects.filter(pk__in=media_ids, type="video").prefetch_related(
+            "optimized_variants"):
+        variants = [
+            (variant.file.url, VIDEO_FORMATS[variant.format]["mime_type"])
+            for variant in get_optimized_variants(media)
+        ]
+        if not variants:
+            continue
+
+        # the editor may use the mp4 variant, published stories then get the variants preferred to it
+        for url in [media.file.url] + [url for url, mime_type in variants]:
+            sources[unquote(urlsplit(url).path)] = variants
+
+    return sources
+
+
+def get_local_file(field_file, directory):
+    """
+    Local path of a file, copied to ``directory`` when its storage is not the filesystem
+    """
+    try:
+        return field_file.path
+    except NotImplementedError:
+        path = os.path.join(directory, "source" + os.path.splitext(field_file.name)[1])
+        with field_file.open("rb") as source, open(path, "wb") as destination:
+            shutil.copyfileobj(source, destination)
+        return path
+
+
+def save_file(field_file, name, path):
+    with open(path, "rb") as f:
+        field_file.save(name, File(f), save=False)
+
+
+def optimize_video(media_id):
+    """
+    Transcode a video to the missing or stale optimized variants, and extract a poster frame if it has no thumbnail
+    """
+    if get_ffmpeg_path() is None:
+        return
+
+    media = get_videos_to_optimize([media_id]).first()
+    if media is None:
+        return
+
+    existing = {variant.format: variant for variant in media.optimized_variants.all()}
+    formats = [
+        video_format for video_format in get_video_formats()
+        if video_format not in existing or existing[video_format].source_name != media.file.name
+    ]
+    base_name = os.path.splitext(os.path.basename(media.file.name))[0]
+    width, height = get_scaled_size(media.width, media.height)
+
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            source = get_local_file(media.file, directory)
+
+            outputs = {}
+            for video_format in formats:
+                outputs[video_format] = os.path.join(directory, f"{base_name}.{video_format}")
+                run_ffmpeg([
+                    "-i", source, "-map", "0:v:0", "-map", "0:a:0?", "-vf", SCALE_FILTER,
+                    *VIDEO_FORMATS[video_format]["args"], outputs[video_format],
+                ])
+
+            poster = None
+            if not media.thumbnail:
+                poster = os.path.join(directory, f"{base_name}.jpg")
+                run_ffmpeg(["-i", source, "-vf", f"thumbnail,{SCALE_FILTER}", "-frames:v", "1", poster])
+        except OSError:
+            logger.warning("Could not optimize video %s, its file is missing", media_id)
+            return
+        except subprocess.CalledProcessError as e:
+            logger.warning("Could not optimize video %s: %s", media_id, e.stderr.decode(errors="replace").strip())
+            return
+        except subprocess.TimeoutExpired:
+            logger.warning("Could not optimize video %s in %s seconds", media_id, get_video_optimization_timeout())
+            return
+
+        with transaction.atomic():
+            for video_format, path in outputs.items():
+                variant = existing.get(video_format) or WebStoryMediaVariant(media=media, format=video_format)
+                stale_name = variant.file.name
+
+                save_file(variant.file, os.path.basename(path), path)
+                variant.width = width
+                variant.height = height
+                variant.source_name = media.file.name
+                variant.save()
+
+                if stale_name:
+                    transaction.on_commit(lambda storage=variant.file.storage, name=stale_name: storage.delete(name))
+
+            if poster:
+                save_file(media.thumbnail, os.path.basename(poster), poster)
+                # not saving the media, which would start its optimization again
+                get_media_model().objects.filter(pk=media.pk).update(thumbnail=media.thumbnail.name)
+
+    video_optimized.send(sender=WebStoryMediaVariant, media_id=media.pk)
+
+
+def optimize_claimed_video(media_id):
+    try:
+        optimize_video(media_id)
+    finally:
+        release_video_optimization(media_id)
+
+
+if task is not None:
+    @task()
+    def optimize_video_task(media_id):
+        optimize_claimed_video(media_id)
+else:
+    optimize_video_task = None
+
+
+def enqueue_video_optimization(media_ids):
+    """
+    Optimize the videos among ``media_ids`` that have no up to date variants, with a django-tasks worker when it is
+    installed, or else in a pool of background threads: transcoding takes far too long to keep a request waiting
+    """
+    if get_ffmpeg_path() is None or not media_ids:
+        return
+
+    for media_id in get_videos_to_optimize(media_ids).values_list("pk", flat=True):
+        if not claim_video_optimization(media_id, get_video_optimization_timeout() * (len(get_video_formats()) + 1)):
+            continue
+
+        enqueue(optimize_video_task, optimize_claimed_video, media_id, pool="video-optimization",
+                workers=get_video_optimization_workers())
@@ -1,67 +1,200 @@
 import json
 
-from django.core.paginator import Paginator
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.db import transaction
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import require_POST
+from wagtail.admin.admin_url_finder import AdminURLFinder
 from wagtail.api.v2.utils import get_full_url
-
+from wagtail.log_actions import log
+
+from wagtail_webstories_editor.cache import (
+    get_editor_html,
+    get_publisher_logos_etag,
+    invalidate_setting_cache,
+    set_editor_html
+)
+from wagtail_webstories_editor.compression import get_request_body
+from wagtail_webstories_editor.dashboard import (
+    InvalidCursor,
+    filter_stories,
+    filter_stories_by_status,
+    get_stories_page,
+    get_story_counts_by_status,
+    get_story_statuses,
+    get_total_pages,
+    get_total_story_counts
+)
+from wagtail_webstories_editor.json_patch import JSONPatchError, apply_json_patch, apply_text_splice
 from wagtail_webstories_editor.models import WebStory, WebStoriesSetting, WebStoriesPublisherLogo
+from wagtail_webstories_editor.utils import process_story_html
 
 
 def web_stories_list(request):
-    web_stories = WebStory.objects.all().order_by("-last_published_at")
-    paginator = Paginator(web_stories, 20)
+    """
+    A page of stories for the dashboard, filtered by status, search and author. Pages follow each other with
+    the ``after`` cursor returned as ``nextCursor``.
+    """
+    try:
+        page_number = max(int(request.GET.get("page", 1)), 1)
+        author = int(request.GET["author"]) if request.GET.get("author") else None
+    except ValueError:
+        return JsonResponse({"error": "invalid_parameter"}, status=400)
+
+    statuses = get_story_statuses(request.GET.get("status"))
+    search = request.GET.get("search", "").strip()
+
+    web_stories = filter_stories(WebStory.objects.summary(), search=search, author=author)
+
+    if search or author:
+        story_counts = get_story_counts_by_status(web_stories)
+    else:
+        story_counts = get_total_story_counts()
+
+    try:
+        stories, next_cursor = get_stories_page(
+            filter_stories_by_status(web_stories, statuses),
+            sort=request.GET.get("orderby"),
+            direction=request.GET.get("order"),
+            cursor=request.GET.get("after"),
+            page=page_number,
+        )
+    except InvalidCursor:
+        return JsonResponse({"error": "invalid_cursor"}, status=400)
+
+    status_count = sum(story_counts[status] for status in statuses)
 
     stories_data = {
         "stories": {},
         "fetchedStoryIds": [],
-        "totalPages": paginator.num_pages,
-        "totalStoriesByStatus": {
-            "all": paginator.count,
-            "publish": web_stories.filter(live=True).count(),
-        },
+        "totalPages": get_total_pages(status_count),
+        "totalStoriesByStatus": story_counts,
+        "nextCursor": next_cursor,
     }
 
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    admin_url_finder = AdminURLFinder()
+    parent_link = None
+
+    for story_obj in stories:
+        if parent_link is None:
+            parent_link = story_obj.get_parent_link(request) or ""
 
-    for story_obj in page_obj:
-        latest_revision = story_obj.get_latest_revision_as_object()
-        story_data = latest_revision.get_story_dashboard_config(request)
+        story_data = story_obj.get_story_dashboard_config(request, admin_url_finder=admin_url_finder,
+                                                          parent_link=parent_link)
 
-        stories_data["stories"].update({latest_revision.pk: story_data})
-        stories_data["fetchedStoryIds"].append(latest_revision.pk)
+        stories_data["stories"].update({story_obj.pk: story_data})
+        stories_data["fetchedStoryIds"].append(story_obj.pk)
 
     return JsonResponse(stories_data)
 
 
 def update_webstory(request, story_id):
-    web_story = get_object_or_404(WebStory, pk=story_id)
+    web_story = get_object_or_404(WebStory.objects.summary(), pk=story_id)
 
     if request.method == 'POST':
+        body = get_request_body(request)
+
         try:
-            data = json.loads(request.body)
+            data = json.loads(body)
             title = data.get("title")
 
             if title:
-                web_story.title = title
-                config = web_story.get_latest_revision_as_object().config
-                if config:
-                    config["title"].update({"raw": title})
-                web_story.config = config
-                web_story.save_revision(changed=True, log_action=True)
+                # rename the latest revision, which carries its own config and html
+                latest_revision = web_story.get_latest_revision_as_object()
+                latest_revision.title = title
+                if latest_revision.config:
+                    latest_revision.config["title"].update({"raw": title})
+                latest_revision.save_revision(changed=True, log_action=True)
+                web_story = latest_revision
 
         except Exception:
             pass
 
-    latest_revision = web_story.get_latest_revision_as_object()
-    story_config = latest_revision.get_story_dashboard_config(request)
+    story_config = web_story.get_story_dashboard_config(request)
 
     return JsonResponse(story_config)
 
 
+@require_POST
+def patch_webstory(request, story_id):
+    """
+    Incremental save of the editor: applies a JSON patch to the config of the latest revision, and a splice
+    to its html (or replaces it), provided the latest revision is still the version the patch was made against
+    """
+    if not request.user.has_perm("wagtail_webstories_editor.change_webstory"):
+        raise PermissionDenied
+
+    try:
+        data = json.loads(get_request_body(request))
+    except ValueError:
+        return JsonResponse({"error": "invalid_json"}, status=400)
+
+    if not isinstance(data, dict):
+        return JsonResponse({"error": "invalid_json"}, status=400)
+
+    with transaction.atomic():
+        web_story = get_object_or_404(WebStory.objects.summary().select_for_update(), pk=story_id)
+
+        lock = web_story.get_lock()
+        if lock and lock.for_user(request.user):
+            return JsonResponse({"error": "locked"}, status=423)
+
+        # coalesced saves keep the id of the revision they update, but change its version
+        if data.get("base_version") != web_story.draft_version:
+            return JsonResponse({"error": "conflict", "revision": web_story.latest_revision_id,
+                                 "version": web_story.draft_version}, status=409)
+
+        latest_revision = web_story.get_latest_revision_as_object()
+
+        if "html" in data:
+            html = data["html"]
+        else:
+            html = get_editor_html(web_story.pk, web_story.draft_version)
+            if html is None:
+                # the html the splice was made against is gone, the editor must send it whole
+                return JsonResponse({"error": "html_missing", "revision": web_story.latest_revision_id,
+                                     "version": web_story.draft_version}, status=409)
+
+        try:
+            config = apply_json_patch(latest_revision.config, data.get("config_patch", []))
+            if "html_splice" in data:
+                html = apply_text_splice(html, data["html_splice"])
+        except JSONPatchError as e:
+            return JsonResponse({"error": "invalid_patch", "message": str(e)}, status=400)
+
+        if not isinstance(config, dict) or not isinstance(html, str):
+            return JsonResponse({"error": "invalid_patch"}, status=400)
+
+        title = config.get("title")
+        title = title.get("raw") if isinstance(title, dict) else None
+        if title:
+            latest_revision.title = title
+
+        slug = config.get("slug")
+        if slug and slug != str(web_story.pk):
+            latest_revision.slug = slug
+
+        web_stories_setting = WebStoriesSetting.for_request(request)
+
+        latest_revision.config = config
+        latest_revision.html = process_story_html(html, web_stories_setting) if html else html
+
+        try:
+            revision = latest_revision.save_draft_revision(request.user, autosave=True)
+        except ValidationError as e:
+            return JsonResponse({"error": "invalid_story", "message": e.messages}, status=400)
+
+        log(instance=latest_revision, action="wagtail.edit", revision=revision, content_changed=True)
+
+    set_editor_html(web_story.pk, latest_revision.draft_version, html)
+
+    return JsonResponse({"revision": revision.pk, "version": latest_revision.draft_version})
+
+
 def duplicate_webstory(request, story_id):
-    web_story = get_object_or_404(WebStory, pk=story_id)
+    web_story = get_object_or_404(WebStory.objects.summary(), pk=story_id)
 
     latest_revision = web_story.get_latest_revision_as_object()
 
@@ -78,9 +211,7 @@ def duplicate_webstory(request, story_id):
     web_story_copy.save()
     web_story_copy.save_revision(changed=True, log_action=True)
 
-    latest_revision = web_story_copy.get_latest_revision_as_object()
-
-    story_config = latest_revision.get_story_dashboard_config(request)
+    story_config = web_story_copy.get_story_dashboard_config(request)
 
     return JsonResponse(story_config)
 
@@ -91,21 +222,23 @@ def handle_publisher_logos(request):
     if request.method == 'POST':
         logo_res = {}
 
+        body = get_request_body(request)
+
         try:
-            data = json.loads(request.body)
+            data = json.loads(body)
             default_logo_id = data.get("default_logo_id")
             image_id = data.get("id")
 
             if default_logo_id:
-                logo_to_set = web_stories_setting.publisher_logos.filter(logo_id=default_logo_id).first()
+                setting_logos = WebStoriesPublisherLogo.objects.filter(setting=web_stories_setting)
+                logo_to_set = setting_logos.select_related("logo").filter(logo_id=default_logo_id).first()
 
-                for p_logo in web_stories_setting.publisher_logos.all():
-                    if p_logo.pk == logo_to_set.pk:
-                        p_logo.default = True
-                    else:
-                        p_logo.default = False
+                # clear the previous default first, a single default per setting is enforced by the database
+                with transaction.atomic():
+                    setting_logos.filter(default=True).exclude(pk=logo_to_set.pk).update(default=False)
+                    setting_logos.filter(pk=logo_to_set.pk).update(default=True)
 
-                    p_logo.save()
+                invalidate_setting_cache([web_stories_setting.site_id])
 
                 logo_res.update({
                     "id": logo_to_set.logo.id,
@@ -126,23 +259,34 @@ def handle_publisher_logos(request):
         return JsonResponse(logo_res)
 
     publisher_logos = web_stories_setting.publisher_logos.all()
-    logos = []
-    for logo in publisher_logos:
-        logos.append({
-            "id": logo.logo.id,
-            "url": get_full_url(request, logo.logo.file.url),
-            "active": logo.default,
-        })
 
-    return JsonResponse(logos, safe=False)
+    etag = get_publisher_logos_etag(request, publisher_logos)
+    response = get_conditional_response(request, etag=etag)
+
+    if response is None:
+        logos = []
+        for logo in publisher_logos:
+            logos.append({
+                "id": logo.logo.id,
+                "url": get_full_url(request, logo.logo.file.url),
+                "active": logo.default,
+            })
+
+        response = JsonResponse(logos, safe=False)
+
+    response["ETag"] = etag
+
+    return response
 
 
 def handle_webstories_settings(request):
     web_stories_setting = WebStoriesSetting.for_request(request)
 
     if request.method == "POST":
+        body = get_request_body(request)
+
         try:
-            data = json.loads(request.body)
+            data = json.loads(body)
 
             for key, value in data.items():
                 setattr(web_stories_setting, key, value)
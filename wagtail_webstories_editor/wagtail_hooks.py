@@ -8,10 +8,11 @@ from wagtail.snippets.models import register_snippet
 from wagtail.snippets.views.snippets import SnippetViewSet, EditView, CreateView
 
 from .models import WebStory, WebStoriesSetting
-from .utils import add_video_cache, add_google_analytics
+from .utils import process_story_html
 from .views import (
     web_stories_list,
     update_webstory,
+    patch_webstory,
     duplicate_webstory,
     handle_publisher_logos, handle_webstories_settings
 )
@@ -31,6 +32,7 @@ def register_admin_urls():
     return [
         path("web-stories-list/", web_stories_list, name="web_stories_list"),
         path("web-stories-update/<int:story_id>/", update_webstory, name="web_stories_update"),
+        path("web-stories-patch/<int:story_id>/", patch_webstory, name="web_stories_patch"),
         path("web-stories-duplicate/<int:story_id>/", duplicate_webstory, name="web_stories_duplicate"),
         path("web-stories-publisher-logos/", handle_publisher_logos, name="web_stories_publisher_logos"),
         path("web-stories-settings/", handle_webstories_settings, name="web_stories_settings"),
@@ -75,13 +77,8 @@ class WebStoryVideoCacheCreateEditMixin:
         if self.draftstate_enabled:
             instance = self.form.save(commit=False)
             
-            if web_stories_setting.video_cache and instance.html:
-                html = add_video_cache(instance.html, web_stories_setting.video_cache)
-                instance.html = html
-            
-            if web_stories_setting.google_analytics_id:
-                html = add_google_analytics(instance.html, web_stories_setting.google_analytics_id)
-                instance.html = html
+            if instance.html:
+                instance.html = process_story_html(instance.html, web_stories_setting)
             
             # If DraftStateMixin is applied, only save to the database in CreateView,
             # and make sure the live field is set to False.
@@ -92,13 +89,8 @@ class WebStoryVideoCacheCreateEditMixin:
         else:
             instance = self.form.save(commit=False)
             
-            if web_stories_setting.video_cache and instance.html:
-                html = add_video_cache(instance.html, web_stories_setting.video_cache)
-                instance.html = html
-            
-            if web_stories_setting.google_analytics_id:
-                html = add_google_analytics(instance.html, web_stories_setting.google_analytics_id)
-                instance.html = html
+            if instance.html:
+                instance.html = process_story_html(instance.html, web_stories_setting)
             
             instance.save()
         
@@ -107,7 +99,11 @@ class WebStoryVideoCacheCreateEditMixin:
         # Save revision if the model inherits from RevisionMixin
         self.new_revision = None
         if self.revision_enabled:
-            self.new_revision = instance.save_revision(user=self.request.user)
+            # rapid saves from the editor update the latest draft revision, instead of piling up new ones
+            if self.view_name == "edit" and self.action == "edit":
+                self.new_revision = instance.save_draft_revision(self.request.user)
+            else:
+                self.new_revision = instance.save_revision(user=self.request.user)
         
         log(
             instance=instance,
@@ -40,6 +40,7 @@ export const defaultSettingsState = {
     mgidWidgetId: '',
     archivePageId: 0,
     videoCache: false,
+    mediaOptimization: false,
     dataRemoval: false,
     settingSaved: false,
     autoAdvance: true,
@@ -75,6 +76,7 @@ function settingsReducer(state, action) {
                 adManagerSlotId: action.payload.adManagerSlotId,
                 mgidWidgetId: action.payload.mgidWidgetId,
                 videoCache: action.payload.videoCache,
+                mediaOptimization: action.payload.mediaOptimization,
                 dataRemoval: action.payload.dataRemoval,
                 autoAdvance: action.payload.autoAdvance,
                 defaultPageDuration: action.payload.defaultPageDuration,
@@ -21,6 +21,25 @@ import {useCallback} from '@googleforcreators/react';
 import {useConfig} from '@googleforcreators/story-editor';
 import {getVideoLength, hasVideoGotAudio, preloadVideo, seekVideo} from '@googleforcreators/media';
 
+// the API does not return more items than its WAGTAILAPI_LIMIT_MAX setting, 20 by default
+const API_BATCH_SIZE = 20
+
+/**
+ * Fetch the API items with the given ids in batched requests, in the order of the ids
+ */
+async function fetchApiItems(apiUrl, ids) {
+    const batches = []
+    for (let start = 0; start < ids.length; start += API_BATCH_SIZE) {
+        const batchIds = ids.slice(start, start + API_BATCH_SIZE)
+        const url = `${apiUrl.replace(/\/$/, "")}/?id=${batchIds.join(",")}&limit=${batchIds.length}`
+        batches.push(fetch(url).then(res => res.json()).then(({items}) => items))
+    }
+
+    const items = (await Promise.all(batches)).flat()
+    const itemsById = new Map(items.map(item => [item.id, item]))
+
+    return ids.map(id => itemsById.get(Number(id))).filter(Boolean)
+}
 
 function showVideoModal(onSelect) {
     window.ModalWorkflow({
@@ -30,12 +49,15 @@ function showVideoModal(onSelect) {
             mediaChosen: async function (videoData) {
                 const {id} = videoData
 
-                const videoSrc = window.wagtailMediaApiUrl.replace(/\/$/, "") + `/${id}`
+                const media = await fetchApiItems(window.wagtailMediaApiUrl, [id]).then(([media]) => {
+                    // the optimized mp4 variant plays in every browser, published stories also get the others
+                    const optimized = (media.meta.optimized || []).find(variant => variant.mime_type === "video/mp4")
 
-                const media = await fetch(videoSrc).then(res => res.json()).then(media => {
                     return {
-                        mimeType: media.meta.mime_type,
-                        url: media.meta.download_url,
+                        mimeType: optimized ? optimized.mime_type : media.meta.mime_type,
+                        url: optimized ? optimized.url : media.meta.download_url,
+                        isOptimized: Boolean(optimized),
+                        poster: media.meta.thumbnail_url,
                         title: media.title,
                         id: media.id
                     }
@@ -46,6 +68,8 @@ function showVideoModal(onSelect) {
                     src: media.url,
                     type: "video",
                     mimeType: media.mimeType,
+                    isOptimized: media.isOptimized,
+                    poster: media.poster,
                     sizes: {},
                 }
 
@@ -75,9 +99,7 @@ function showAudioModal(onSelect) {
             mediaChosen: async function (audioData) {
                 const {id} = audioData
 
-                const audioSrc = window.wagtailMediaApiUrl.replace(/\/$/, "") + `/${id}`
-
-                const media = await fetch(audioSrc).then(res => res.json()).then(media => {
+                const media = await fetchApiItems(window.wagtailMediaApiUrl, [id]).then(([media]) => {
                     return {
                         mimeType: media.meta.mime_type,
                         url: media.meta.download_url,
@@ -106,8 +128,7 @@ function showCaptionModal(onSelect) {
     const documentModal = new window.DocumentChooserModal(window.documentChooserUrl)
     documentModal.open({}, async (documentData) => {
         const {id} = documentData
-        const docSrc = window.wagtailDocumentApiUrl.replace(/\/$/, "") + `/${id}`
-        const file = await fetch(docSrc).then(res => res.json()).then(doc => {
+        const file = await fetchApiItems(window.wagtailDocumentApiUrl, [id]).then(([doc]) => {
             return {
                 mimeType: doc.meta.mime_type,
                 url: doc.meta.download_url,
@@ -130,36 +151,26 @@ function showCaptionModal(onSelect) {
     })
 }
 
-function showImageModal(onSelect) {
+function showImageModal(onSelect, multiple) {
     const imageModal = new window.ImageChooserModal(window.imageChooserUrl)
-    imageModal.open({}, async (imageData) => {
-        const {id} = imageData
-        const imageSrc = window.wagtailImageApiUrl.replace(/\/$/, "") + `/${id}`
+    imageModal.open({multiple}, async (imageData) => {
+        // a list of images when multiple images are chosen
+        const ids = [].concat(imageData).map(({id}) => id)
 
-        const image = await fetch(imageSrc).then(res => res.json()).then(img => {
-            return {
+        const images = await fetchApiItems(window.wagtailImageApiUrl, ids)
+
+        images.forEach(img => {
+            onSelect({
+                id: img.id,
+                type: "image",
                 mimeType: img.meta.mime_type,
-                url: img.meta.download_url,
-                title: img.title,
+                src: img.meta.download_url,
                 width: img.meta.size.width,
                 height: img.meta.size.height,
-                id: img.id,
-
-            }
+                alt: img.title,
+                sizes: {},
+            });
         })
-
-        const imageResource = {
-            id: image.id,
-            type: "image",
-            mimeType: image.mimeType,
-            src: image.url,
-            width: image.width,
-            height: image.height,
-            alt: image.title,
-            sizes: {},
-        }
-
-        onSelect(imageResource);
     })
 }
 
@@ -190,7 +201,7 @@ function useMediaPicker({onSelect, onClose, multiple = false}) {
                     showCaptionModal(onSelect)
                     break
                 default:
-                    showImageModal(onSelect)
+                    showImageModal(onSelect, multiple)
             }
         },
         [
@@ -36,6 +36,7 @@ import styled from 'styled-components';
 import useApiAlerts from '../../api/hooks/useApiAlerts';
 import PublisherLogoSettings from './publisherLogo';
 import VideoCacheSettings from './videoCache';
+import MediaOptimizationSettings from './mediaOptimization';
 import GoogleAnalyticsSettings from './googleAnalytics';
 import {Main, Wrapper} from './components';
 import useEditorSettings from './useEditorSettings';
@@ -53,6 +54,7 @@ function EditorSettings() {
         newlyCreatedMediaIds,
         isMediaLoading,
         videoCache,
+        mediaOptimization,
         fetchCustomFonts,
         publisherLogos,
         addPublisherLogo,
@@ -80,6 +82,7 @@ function EditorSettings() {
                      usingLegacyAnalytics,
                      mgidWidgetId,
                      videoCache,
+                     mediaOptimization,
                      dataRemoval,
                      autoAdvance,
                      defaultPageDuration,
@@ -97,6 +100,7 @@ function EditorSettings() {
             isMediaLoading,
             newlyCreatedMediaIds,
             videoCache,
+            mediaOptimization,
             dataRemoval,
             searchPages,
             getPageById,
@@ -146,6 +150,11 @@ function EditorSettings() {
         [updateSettings]
     );
 
+    const handleUpdateMediaOptimization = useCallback(
+        () => updateSettings({mediaOptimization: !mediaOptimization}),
+        [updateSettings, mediaOptimization]
+    );
+
     const handleAddLogos = useCallback(
         async (files) => {
             let allFileSizesWithinMaxUpload = true;
@@ -300,6 +309,11 @@ function EditorSettings() {
                                     isEnabled={videoCache}
                                     updateSettings={updateSettings}
                                 />
+                                <MediaOptimizationSettings
+                                    selected={mediaOptimization}
+                                    onCheckboxSelected={handleUpdateMediaOptimization}
+                                    disabled={false}
+                                />
                                 <PageAdvancement
                                     updateSettings={updateSettings}
                                     autoAdvance={autoAdvance}